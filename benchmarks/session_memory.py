@@ -0,0 +1,60 @@
+"""
+Measures memory held per open MDC session (connection object,
+StreamReader/StreamWriter, transport and socket) with tracemalloc,
+against local listening socket (connections are completed by kernel
+backlog, so there are no server side allocations).
+
+    python benchmarks/session_memory.py [SESSIONS] [READ_LIMIT]
+"""
+import asyncio
+import gc
+import resource
+import socket
+import sys
+import tracemalloc
+
+from samsung_mdc import MDC
+
+
+async def main(sessions, read_limit):
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(sessions + 1)
+    port = server.getsockname()[1]
+
+    # Not measuring lazily created module level objects of first connection
+    await MDC(f'127.0.0.1:{port}').open()
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    connections = [MDC(f'127.0.0.1:{port}', read_limit=read_limit)
+                   for _ in range(sessions)]
+    for connection in connections:
+        await connection.open()
+
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    total = sum(stat.size_diff for stat in stats)
+    print(f'Sessions: {sessions}')
+    print(f'Read limit: {read_limit}')
+    print(f'Traced: {total / sessions:.0f} bytes per session')
+    print('Top allocations per session:')
+    for stat in stats[:5]:
+        print(f'  {stat.size_diff / sessions:8.0f}'
+              f'  {stat.traceback[0].filename}')
+    print(f'Max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss} KiB')
+
+    for connection in connections:
+        await connection.close()
+    server.close()
+
+
+if __name__ == '__main__':
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    read_limit = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    asyncio.run(main(sessions, read_limit))
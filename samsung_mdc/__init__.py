@@ -4,10 +4,12 @@ import inspect
 from .version import __version__  # noqa
 from .connection import MDCConnection
 from .command import Command
+from .exceptions import MDCUnsupportedCommand
 from . import commands
 
 
 class MDC(MDCConnection):
+    __slots__ = ()
     _commands: Dict[str, Command] = {}
 
     @classmethod
@@ -15,6 +17,27 @@ class MDC(MDCConnection):
         cls._commands[command.name] = command
         setattr(cls, command.name, command)
 
+    async def resolve_command(self, display_id, *commands):
+        """
+        Returns first of commands (or command names) known as supported
+        by display model, or first not known as unsupported,
+        so supported variant may be picked (like CLOCK_S/CLOCK_M).
+        Requires capabilities (see capabilities.CapabilityCache).
+        """
+        commands = [
+            self._commands[command] if isinstance(command, str) else command
+            for command in commands
+        ]
+        if self.capabilities is None:
+            return commands[0]
+        model = await self.capabilities.get_model(self, display_id)
+        for supported in (True, None):
+            for command in commands:
+                if self.capabilities.is_supported(
+                   model, command.name) is supported:
+                    return command
+        raise MDCUnsupportedCommand(commands[-1].name, model)
+
 
 for name, cls in inspect.getmembers(commands, inspect.isclass):
     if (issubclass(cls, Command)
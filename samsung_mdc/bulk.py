@@ -0,0 +1,169 @@
+from collections import namedtuple
+
+from . import fields
+from .connection import HEADER_CODE, RESPONSE_CMD, ACK_CODE
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    raise ImportError('numpy is required for bulk decoding '
+                      '(pip install numpy)')
+
+
+# Columns are arrays by RESPONSE_DATA field name (values of not valid
+# frames are undefined), valid is mask of ACK frames of command
+# with correct checksum and values
+Decoded = namedtuple('Decoded', 'display_id valid columns')
+
+
+def _get_dtype(field):
+    # numpy dtype of fixed-width field, None if not supported
+    if isinstance(field, fields.Int) and field.length in (1, 2, 4, 8):
+        return np.dtype(f'{">" if field.byteorder == "big" else "<"}'
+                        f'u{field.length}')
+    if isinstance(field, (fields.Enum, fields.VideoWallModel)):
+        # Bitmask is Enum as well
+        return np.dtype('u1')
+    if isinstance(field, fields.Time12H):
+        return np.dtype(('u1', (3,)))
+    return None
+
+
+def get_dtype(command):
+    """
+    Returns structured dtype of command response data,
+    or None if it has fields without fixed width (like Str/StrCoded).
+    """
+    rv = []
+    for field in command.RESPONSE_DATA:
+        dtype = _get_dtype(field)
+        if dtype is None:
+            return None
+        name, i = field.name, 1
+        while name in [x[0] for x in rv]:
+            i += 1
+            name = f'{field.name}_{i}'
+        rv.append((name, dtype))
+    return np.dtype(rv)
+
+
+def _get_cmd_codes(command):
+    # Timers have CMD parametrized by TIMER_ID
+    return getattr(command, '_TIMER_ID_CMD', [command.CMD])
+
+
+def get_offsets(buffer):
+    """
+    Returns array of frames offsets in buffer of frames.
+    """
+    data = np.frombuffer(buffer, np.uint8)
+    if len(data) >= 4:
+        # Fast path for frames of same length (same command responses)
+        size = int(data[3]) + 5
+        if (len(data) % size == 0
+           and (data[0::size] == HEADER_CODE).all()
+           and (data[3::size] == size - 5).all()):
+            return np.arange(0, len(data), size)
+
+    rv, offset = [], 0
+    while offset + 4 < len(buffer):
+        rv.append(offset)
+        offset += buffer[offset + 3] + 5
+    return np.array(rv, dtype=np.int64)
+
+
+def _decode_column(field, column, valid):
+    # Converts raw column to values, invalidating not parsable ones
+    if isinstance(field, fields.Int):
+        if field.range is not None:
+            valid &= (column >= field.range.start) & (
+                column < field.range.stop)
+        if isinstance(field, fields.Bool):
+            return column.astype(bool)
+        return column
+    if isinstance(field, fields.Bitmask):
+        return column
+    if isinstance(field, fields.Enum):
+        valid &= np.isin(column, [x.value for x in field.enum])
+        return column
+    if isinstance(field, fields.Time12H):
+        # [hour (1-12), minute, day part (AM=1, PM=0)] to seconds of day
+        hour, minute, am = column[:, 0], column[:, 1], column[:, 2]
+        valid &= (hour >= 1) & (hour <= 12) & (minute < 60)
+        hour = hour.astype(np.int32) % 12 + np.where(am, 0, 12)
+        return (hour * 3600 + minute.astype(np.int32) * 60).astype(
+            'timedelta64[s]')
+    return column
+
+
+def decode(buffer, command):
+    """
+    Decodes buffer of many response frames (like captured RECEIVED
+    frames joined together) of command to columns (see Decoded).
+
+    Frames are validated and decoded with vectorized operations
+    if command response has only fixed-width fields, otherwise
+    (like Str/StrCoded) response data is parsed per frame
+    with command.parse_response_data to object arrays.
+    Enum and Bitmask columns are raw values, Time12H columns
+    are timedelta64 since midnight.
+    """
+    data = np.frombuffer(buffer, np.uint8)
+    offsets = get_offsets(buffer)
+    data_start = 6 if command.SUBCMD is None else 7
+
+    dtype = get_dtype(command)
+    if dtype is None:
+        return _decode_per_frame(buffer, command, offsets, data_start)
+
+    size = data_start + dtype.itemsize + 1
+    # Frames of other length (NAK, other commands) are not valid
+    frames_mask = (
+        (data[offsets + 3] == size - 5) & (offsets + size <= len(data)))
+    rows = np.zeros((len(offsets), size), np.uint8)
+    rows[frames_mask] = data[
+        offsets[frames_mask][:, None] + np.arange(size)]
+
+    valid = (
+        frames_mask
+        & (rows[:, 0] == HEADER_CODE)
+        & (rows[:, 1] == RESPONSE_CMD)
+        & (rows[:, 4] == ACK_CODE)
+        & np.isin(rows[:, 5], _get_cmd_codes(command))
+        & (rows[:, 1:-1].sum(axis=1, dtype=np.uint32) % 256 == rows[:, -1])
+    )
+    if command.SUBCMD is not None:
+        valid &= rows[:, 6] == command.SUBCMD
+
+    records = np.ascontiguousarray(
+        rows[:, data_start:-1]).view(dtype).reshape(len(rows))
+    columns = {
+        name: _decode_column(field, records[name], valid)
+        for name, field in zip(dtype.names, command.RESPONSE_DATA)
+    }
+    return Decoded(data[offsets + 2], valid, columns)
+
+
+def _decode_per_frame(buffer, command, offsets, data_start):
+    names = [field.name for field in command.RESPONSE_DATA]
+    display_id = np.zeros(len(offsets), np.uint8)
+    valid = np.zeros(len(offsets), bool)
+    columns = {name: np.full(len(offsets), None, object) for name in names}
+    for i, offset in enumerate(offsets.tolist()):
+        frame = buffer[offset:offset + buffer[offset + 3] + 5]
+        display_id[i] = frame[2]
+        if (len(frame) < data_start + 1
+           or frame[1] != RESPONSE_CMD
+           or frame[4] != ACK_CODE
+           or frame[5] not in _get_cmd_codes(command)
+           or (command.SUBCMD is not None and frame[6] != command.SUBCMD)
+           or sum(frame[1:-1]) % 256 != frame[-1]):
+            continue
+        try:
+            values = command.parse_response_data(frame[data_start:-1])
+        except Exception:
+            continue
+        valid[i] = True
+        for name, value in zip(names, values):
+            columns[name][i] = value
+    return Decoded(display_id, valid, columns)
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+
+from .commands import MODEL_NAME, SOFTWARE_VERSION
+from .exceptions import NAKError
+from .tls import target_key
+
+
+class CapabilityCache:
+    """
+    Remembers which commands are supported (ACK) or not (NAK) by device
+    model (MODEL_NAME/SOFTWARE_VERSION), so unsupported commands are
+    refused without request (MDCUnsupportedCommand is raised).
+    Persisted to JSON file if path provided.
+    """
+    # Commands used to identify model, always requested
+    IDENTITY_COMMANDS = (MODEL_NAME.name, SOFTWARE_VERSION.name)
+
+    def __init__(self, path=None):
+        self.path = path
+        self._models = {}
+        if path and os.path.exists(path):
+            with open(path) as fh:
+                self._models = json.load(fh)
+        # (target, display_id): model
+        self._targets = {}
+
+    async def get_model(self, connection, display_id):
+        """
+        Returns model of display (requested once per target),
+        or None if model can't be identified.
+        """
+        key = (target_key(connection.target), display_id)
+        if key not in self._targets:
+            try:
+                (name,), (version,) = await asyncio.gather(
+                    MODEL_NAME()(connection, display_id),
+                    SOFTWARE_VERSION()(connection, display_id))
+            except NAKError:
+                self._targets[key] = None
+            else:
+                self._targets[key] = f'{name}/{version}'
+        return self._targets[key]
+
+    def is_supported(self, model, command):
+        """
+        Returns True/False if command is known as supported/unsupported
+        by model, None if unknown.
+        """
+        return self._models.get(model, {}).get('commands', {}).get(command)
+
+    def set_supported(self, model, command, supported):
+        self._models.setdefault(model, {}).setdefault(
+            'commands', {})[command] = supported
+
+    def get(self, model, key, default=None):
+        """
+        Returns other model value (like learned virtual remote timing)
+        """
+        return self._models.get(model, {}).get(key, default)
+
+    def set(self, model, key, value):
+        self._models.setdefault(model, {})[key] = value
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(self._models, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
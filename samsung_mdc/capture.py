@@ -0,0 +1,217 @@
+from collections import namedtuple
+import asyncio
+import struct
+import time
+
+from . import MDC
+from .command import Command
+from .connection import SENT, RECEIVED, HEADER_CODE
+from .exceptions import MDCResponseError
+from .tls import target_key
+
+
+MAGIC = b'MDCCAP1\n'
+# Record length (without length itself), timestamp, direction, target length
+# followed by target and frame bytes
+RECORD_HEADER = struct.Struct('<IdBH')
+
+Record = namedtuple('Record', 'timestamp direction target frame')
+
+
+class CaptureWriter:
+    """
+    Append-only binary log of frames sent and raw bytes received
+    (before validation, so garbage and corrupted frames are kept)
+    by connections (see MDCConnection capture parameter),
+    may be shared by connections.
+    Writes are buffered, so call close (or flush) to persist them.
+    """
+    def __init__(self, path, buffer_size=1 << 16):
+        self.path = path
+        self._file = open(path, 'ab', buffering=buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def write(self, direction, target, frame, timestamp=None):
+        target = target_key(target).encode()
+        self._file.write(RECORD_HEADER.pack(
+            RECORD_HEADER.size - 4 + len(target) + len(frame),
+            time.time() if timestamp is None else timestamp,
+            direction, len(target)))
+        self._file.write(target)
+        self._file.write(frame)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_capture(path):
+    """
+    Yields capture Record, truncated last record
+    (capture was not closed properly) is ignored.
+    """
+    with open(path, 'rb') as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'Not a capture file: {path}')
+        while True:
+            header = fh.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, timestamp, direction, target_length = \
+                RECORD_HEADER.unpack(header)
+            body = fh.read(length - RECORD_HEADER.size + 4)
+            if len(body) < length - RECORD_HEADER.size + 4:
+                return
+            yield Record(timestamp, direction,
+                         body[:target_length].decode(), body[target_length:])
+
+
+def split_frames(payload):
+    """
+    Returns (cmd, display_id, data) for each frame in payload
+    (one frame or several in case of pipelined batch).
+    """
+    rv = []
+    while payload:
+        if payload[0] != HEADER_CODE or len(payload) < 5:
+            raise MDCResponseError('Unexpected frame', payload)
+        length = payload[3]
+        rv.append((payload[1], payload[2], payload[4:4 + length]))
+        payload = payload[5 + length:]
+    return rv
+
+
+def get_commands(cmd, data):
+    """
+    Returns ((cmd, subcmd), data, commands) for request frame,
+    commands are candidates to parse response (like TIMER_15/TIMER_13).
+    """
+    rv = []
+    for command in MDC._commands.values():
+        codes = getattr(command, '_TIMER_ID_CMD', [command.CMD])
+        if cmd not in codes:
+            continue
+        if command.SUBCMD is not None:
+            if data[:1] == bytes([command.SUBCMD]):
+                rv.insert(0, command)
+        else:
+            rv.append(command)
+    if rv and rv[0].SUBCMD is not None:
+        rv = [command for command in rv if command.SUBCMD is not None]
+        return (cmd, rv[0].SUBCMD), data[1:], rv
+    return (cmd, None), data, rv
+
+
+def decode_response(commands, response):
+    """
+    Returns response data parsed with first of commands able to parse it
+    (raw data if there are no commands).
+    """
+    data = Command.parse_response(response)
+    exc = None
+    for command in commands:
+        try:
+            return command.parse_response_data(data)
+        except Exception as exc_:
+            exc = exc_
+    if exc is not None:
+        raise exc
+    return data
+
+
+class _ReplayWriter:
+    transport = None
+
+    def __init__(self, mdc):
+        self.mdc = mdc
+
+    def write(self, data):
+        self.mdc._feed_responses()
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class ReplayMDC(MDC):
+    """
+    Connection responding with captured responses of target
+    (in order, regardless of requests) with captured delays
+    divided by speed (0 for no delays).
+    """
+    def __init__(self, target, records, speed=1, **kwargs):
+        super().__init__(target, **kwargs)
+        self.speed = speed
+        # [[(delay, frame), ...] for each sent record]
+        self._responses, sent_timestamp = [], None
+        for record in records:
+            if record.direction == SENT:
+                sent_timestamp = record.timestamp
+                self._responses.append([])
+            elif record.direction == RECEIVED and self._responses:
+                self._responses[-1].append(
+                    (record.timestamp - sent_timestamp, record.frame))
+
+    async def open(self):
+        self.reader = asyncio.StreamReader()
+        self.writer = _ReplayWriter(self)
+
+    def _feed_responses(self):
+        if not self._responses:
+            return
+        loop = asyncio.get_event_loop()
+        for delay, frame in self._responses.pop(0):
+            if self.speed:
+                loop.call_later(delay / self.speed,
+                                self.reader.feed_data, frame)
+            else:
+                self.reader.feed_data(frame)
+
+
+async def replay(mdc, records, callback):
+    """
+    Sends captured requests of target with mdc connection
+    (see ReplayMDC to reproduce captured responses).
+    callback(display_id, name, response or exception, rtt)
+    is called for every request.
+    """
+    loop = asyncio.get_event_loop()
+    for record in records:
+        if record.direction != SENT:
+            continue
+        requests = []
+        for cmd, display_id, data in split_frames(record.frame):
+            cmd, data, commands = get_commands(cmd, data)
+            requests.append((cmd, display_id, data, commands))
+
+        start = loop.time()
+        try:
+            responses = await mdc.send_batch(
+                [request[:3] for request in requests])
+        except Exception as exc:
+            responses = [exc] * len(requests)
+        rtt = loop.time() - start
+
+        for (cmd, display_id, data, commands), response in zip(
+                requests, responses):
+            name = commands[0].name if commands else hex(cmd[0])
+            if not isinstance(response, Exception):
+                try:
+                    response = decode_response(commands, response)
+                except Exception as exc:
+                    response = exc
+            callback(display_id, name, response, rtt)
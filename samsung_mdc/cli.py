@@ -7,6 +7,7 @@
 
 from datetime import time, datetime
 from enum import Enum
+from functools import partial
 import asyncio
 import re
 import os.path
@@ -19,6 +20,14 @@ import click
 from . import MDC, fields, __version__
 from .utils import parse_hex, repr_hex
 from .exceptions import NAKError
+from .tls import TLSTargetCache
+from .inventory import DEFAULT_TTL
+from .fleet import fan_out, preconnect, run_sharded
+from .targets import (
+    create_target, detect_mode, get_endpoint, iter_targets, load_targets,
+    is_ip,
+    _parse_int, _win_com_port_regexp)
+from .connection import CONNECTION_MODE
 
 
 def print_exception(exc):
@@ -26,10 +35,6 @@ def print_exception(exc):
     _print_exception(type(exc), exc, exc.__traceback__)
 
 
-def _parse_int(x):
-    return int(x, 16) if x.startswith('0x') else int(x)
-
-
 def _repr(val, root=True):
     if isinstance(val, list):
         # quickfix for script command repr
@@ -161,7 +166,9 @@ class ArgumentWithHelpCommandMixin:
 
     def format_options(self, ctx, formatter):
         # Override this to format ArgumentWithHelp before options
-        self.format_arguments(ctx, formatter)
+        # (click>=8.2 calls format_arguments itself)
+        if not hasattr(click.Command, 'format_arguments'):
+            self.format_arguments(ctx, formatter)
         super().format_options(ctx, formatter)
 
 
@@ -196,7 +203,52 @@ class FixedSubcommand(ArgumentWithHelpCommandMixin, click.Command):
         formatter.write_usage(root_path, " ".join(pieces))
 
 
+class TargetlessSubcommand(FixedSubcommand):
+    # Subcommand not requiring TARGET (like "discover"), see Group.parse_args
+
+    def format_usage(self, ctx, formatter):
+        root_path = ctx.command_path.split()[0]
+        pieces = ['[OPTIONS]', self.name]
+        pieces.extend(self.collect_usage_pieces(ctx))
+        formatter.write_usage(root_path, " ".join(pieces))
+
+
+# Placeholder for TARGET argument for TargetlessSubcommand
+TARGETLESS = ''
+
+
 class Group(click.Group):
+    def parse_args(self, ctx, args):
+        # click doesn't support optional group argument before subcommand,
+        # so placeholder is inserted as TARGET for TargetlessSubcommand
+        options = {
+            opt: param for param in self.get_params(ctx)
+            if isinstance(param, click.Option)
+            for opt in param.opts + param.secondary_opts
+        }
+        i = 0
+        while i < len(args) and args[i] != '--':
+            arg = args[i]
+            if arg.startswith('-'):
+                option = options.get(arg)
+                if option is not None and not option.is_flag:
+                    i += 1  # skip option value
+                i += 1
+                continue
+            command = self.commands.get(arg)
+            if isinstance(command, TargetlessSubcommand):
+                ctx.meta['samsung_mdc.targetless'] = True
+                args = args[:i] + [TARGETLESS] + args[i:]
+            break
+        return super().parse_args(ctx, args)
+
+    def invoke(self, ctx):
+        rv = super().invoke(ctx)
+        if ctx.obj and ctx.obj.get('unreachable'):
+            # Targets skipped by --preconnect are failed as well
+            ctx.exit(1)
+        return rv
+
     def get_help_option(self, ctx):
         # Override this to pass parameters to --help
         # This is needed to be able to do "--help COMMAND"
@@ -377,7 +429,8 @@ class MDCClickCommand(FixedSubcommand):
                 raise exc
             raise
 
-    def create_mdc_call(self, params):
+    def get_mdc_args(self, params):
+        # Converts parsed params to mdc_command call args (data last)
         args = tuple(params.values())
         if isinstance(self.mdc_command.CMD, fields.Field):
             args = args[0], args[1:]
@@ -387,59 +440,74 @@ class MDCClickCommand(FixedSubcommand):
         if args and not self.mdc_command.SET:
             raise click.UsageError('Readonly command doesn\'t accept '
                                    'any arguments')
+        return args
 
-        async def mdc_call(connection, display_id):
-            try:
-                print(f'{display_id}@{connection.target}',
-                      _repr(await self.mdc_command(connection, display_id,
-                                                   *args)))
-            except Exception as exc:
-                print(f'{display_id}@{connection.target}',
-                      f'{exc.__class__.__name__}: {exc}')
-                raise
-        mdc_call.name = self.name
-        mdc_call.args = args
-        return mdc_call
+    def create_mdc_call(self, params):
+        return MDCCall(self.mdc_command, self.get_mdc_args(params))
 
 
-class MDCTargetParamType(click.ParamType):
-    name = 'mdc_target'
+class MDCCall:
+    # Call of mdc_command for target printing response,
+    # class (not closure) so it's picklable for worker processes
+    def __init__(self, mdc_command, args):
+        self.mdc_command = mdc_command
+        self.name = mdc_command.name
+        self.args = args
 
-    _win_com_port_regexp = re.compile(r'COM\d+', re.IGNORECASE)
+    async def __call__(self, connection, display_id):
+        try:
+            print(f'{display_id}@{connection.target}',
+                  _repr(await self.mdc_command(connection, display_id,
+                                               *self.args)))
+        except Exception as exc:
+            print(f'{display_id}@{connection.target}',
+                  f'{exc.__class__.__name__}: {exc}')
+            raise
 
-    # def get_missing_message(self, param):
-    #     return param.help
 
-    def convert_target(self, value, param, ctx):
-        if '@' not in value:
-            self.fail('DISPLAY_ID required (try 0, 1)')
+class ShardCall:
+    # Call for target in worker process (see --processes),
+    # connection is released after call (closed unless shared by
+    # other targets in progress), returns if call succeeded
+    def __init__(self, call, verbose=False):
+        self.call = call
+        self.verbose = verbose
 
-        display_id, addr = value.split('@')
+    async def __call__(self, connection, display_id):
+        connection.acquire()
         try:
-            display_id = _parse_int(display_id)
-        except ValueError:
-            self.fail(
-                f'Invalid DISPLAY_ID "{display_id}" '
-                '(int or hex, example: 1, 0x01, 254, 0xFE)')
-        if ':' in addr:
-            ip, port = addr.split(':')
+            await self.call(connection, display_id)
+        except Exception as exc:
+            if self.verbose:
+                print_exception(exc)
+            return False
+        finally:
             try:
-                port = int(port)
-            except ValueError:
-                self.fail(f'Invalid PORT "{port}"')
-            return 'tcp', f'{ip}:{port}', display_id
-        elif (
-            '/' in addr or addr.startswith('.')
-            or self._win_com_port_regexp.match(addr)
-        ):
-            return 'serial', addr, display_id
-        return 'tcp', addr, display_id
+                await connection.release()
+            except Exception:
+                pass
+        return True
+
+
+class MDCTargetParamType(click.ParamType):
+    name = 'mdc_target'
+
+    # def get_missing_message(self, param):
+    #     return param.help
 
     def convert(self, value, param, ctx):
+        # Returns iterator of targets.Target (lazy for targets file)
+        if value == TARGETLESS and ctx.meta.get('samsung_mdc.targetless'):
+            return []
+        if value == '-':
+            return iter_targets(click.get_text_stream('stdin'), '<stdin>')
         if '@' in value:
-            return [self.convert_target(value, param, ctx)]
+            try:
+                return [create_target(value)]
+            except ValueError as exc:
+                self.fail(str(exc))
         elif (
-            self._win_com_port_regexp.match(value)
+            _win_com_port_regexp.match(value)
             or value.startswith('/dev/')
         ):
             self.fail('Looks like you want to use serial port, '
@@ -447,24 +515,7 @@ class MDCTargetParamType(click.ParamType):
         else:
             if not os.path.exists(value):
                 self.fail(f'FILENAME "{value}" does not exist.')
-            data = open(value).read()
-            data = [
-                (i + 1, line.strip())
-                for i, line in enumerate(data.split('\n'))
-                if line.strip() and not line.strip().startswith('#')
-            ]
-            targets = []
-            for lineno, line in data:
-                try:
-                    targets.append(self.convert_target(line, param, ctx))
-                except click.UsageError as exc:
-                    exc.message = (f'{value}:{lineno}: "{line}": '
-                                   f'{exc.message}')
-                    raise
-            if not targets:
-                self.fail(
-                    f'FILENAME "{value} is empty.')
-            return targets
+            return load_targets(value)
 
 
 MAIN_HELP = """
@@ -476,7 +527,14 @@ TARGET may be:
 
 \b
 DISPLAY_ID@IP[:PORT] (default port: 1515, example: 0@192.168.0.10:1515)
-FILENAME with target list (separated by newline)
+FILENAME with target list (separated by newline), or "-" for stdin
+
+\b
+Target list may be CSV with header or JSON object per line (JSONL)
+with "target" (or "display_id" and "address"), "pin", "timeout",
+"mode" and "tags" (separated by ";") columns/keys, example:
+target,pin,tags
+0@192.168.0.10,1234,lobby;floor1
 
 \b
 For serial port connection:
@@ -505,33 +563,201 @@ but you may want to use --mode option.
         'read/write/connect timeout in seconds (default: 5) '
         '(connect can be overridden with separate option)'))
 @click.option('--connect-timeout', default=None, type=float)
+@click.option('--resync', is_flag=True, default=False,
+              help='Skip noise and corrupted frames searching for response '
+                   'instead of failing (useful on noisy serial lines).')
+@click.option('--tls-auto', is_flag=True, default=False,
+              help='Detect "Secured Protocol" on connect '
+                   '(using PIN from --pin or --pin-map).')
+@click.option('--pin-map', default=None, type=click.File(),
+              help='File with "IP[:PORT] PIN" lines, '
+                   'overrides --pin for specific targets.')
+@click.option('--tls-cache', default=None,
+              type=click.Path(dir_okay=False),
+              help='JSON file to remember which targets require TLS '
+                   '(used with --tls-auto and discover).')
+@click.option('--capabilities', default=None,
+              type=click.Path(dir_okay=False),
+              help='JSON file to remember commands supported by model, '
+                   'so known unsupported commands fail without request.')
+@click.option('--processes', default=None, type=click.IntRange(1),
+              help='Split targets between worker processes (each with '
+                   'own event loop) for display commands (not for script, '
+                   'apply and other helper commands), output is printed in '
+                   'targets order. Learned --tls-cache/--capabilities '
+                   'are not saved from workers.')
+@click.option('--capture', default=None,
+              type=click.Path(dir_okay=False),
+              help='Append sent and received frames to binary capture '
+                   'file (see replay).')
+@click.option('--preconnect', is_flag=True, default=False,
+              help='Connect (and authenticate TLS) to all targets before '
+                   'running command, unreachable targets are reported '
+                   'and skipped.')
+@click.option('--preconnect-concurrency', default=100,
+              type=click.IntRange(1),
+              help='Max connects at once with --preconnect (default: 100).')
+@click.option('--tag', 'tags', multiple=True,
+              help='Run only for targets with tag (from targets file), '
+                   'may be used multiple times.')
 @click.pass_context
-def cli(ctx, target, verbose, mode, pin, **kwargs):
+def cli(ctx, target, verbose, mode, pin, tls_auto, pin_map, tls_cache,
+        capabilities, processes, capture, preconnect,
+        preconnect_concurrency, tags, **kwargs):
+    pins = {}
+    if pin_map:
+        for lineno, line in enumerate(pin_map.read().splitlines(), 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                addr, pin_ = line.split()
+                pins[addr] = int(pin_)
+            except ValueError:
+                raise click.BadParameter(
+                    f'{pin_map.name}:{lineno}: "{line}": '
+                    'expected "IP[:PORT] PIN"', param_hint='--pin-map')
+
+    if processes and not isinstance(
+       cli.commands.get(ctx.invoked_subcommand), MDCClickCommand):
+        # Only display commands are running with run_sharded
+        raise click.UsageError(
+            f'--processes is not supported by {ctx.invoked_subcommand}')
+
+    if tls_cache:
+        tls_cache = TLSTargetCache(tls_cache)
+        ctx.call_on_close(tls_cache.save)
+    if capabilities:
+        from .capabilities import CapabilityCache
+        kwargs['capabilities'] = CapabilityCache(capabilities)
+        ctx.call_on_close(kwargs['capabilities'].save)
+    if preconnect and processes:
+        raise click.BadParameter('not supported with --processes',
+                                 param_hint='--preconnect')
+    if capture:
+        if processes:
+            raise click.BadParameter('not supported with --processes',
+                                     param_hint='--capture')
+        from .capture import CaptureWriter
+        kwargs['capture'] = CaptureWriter(capture)
+        ctx.call_on_close(kwargs['capture'].close)
+    if tls_auto:
+        kwargs['tls'] = 'auto'
+        if tls_cache:
+            kwargs['tls_cache'] = tls_cache
+
     ctx.ensure_object(dict)
-    ctx.obj['targets'] = [(
-        MDC(target, auto_mode if mode == 'auto' else mode,
-            **{'verbose': verbose, 'pin': pin, **kwargs}),
-        display_id
-    ) for auto_mode, target, display_id in target]
+    ctx.obj['pin'] = pin
+    ctx.obj['tls_cache'] = tls_cache
+    ctx.obj['capabilities'] = kwargs.get('capabilities')
+    ctx.obj['processes'] = processes
+    ctx.obj['preconnect'] = preconnect and preconnect_concurrency
+    ctx.obj['unreachable'] = []
+    ctx.obj['targets'] = _create_targets(
+        ctx, target, mode, pin, pins, set(tags), verbose=verbose, **kwargs)
     ctx.obj['verbose'] = verbose
 
+    hosts = [
+        connection.target.split(':')[0]
+        for connection, _ in ctx.obj['targets']
+        if connection.mode == CONNECTION_MODE.TCP
+    ]
+    if any(not is_ip(host) for host in hosts):
+        asyncio_run_coroutine(MDC.dns_cache.resolve_all(hosts))
+
 
-def asyncio_run(call, targets, verbose=False):
+def _iter_valid(targets):
+    try:
+        yield from targets
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint='TARGET')
+
+
+def _create_targets(ctx, targets, mode, pin, pins, tags, **kwargs):
+    # Creating connections while targets file is streamed,
+    # so parsed targets are not kept in memory.
+    # Targets behind same endpoint (serial gateway, daisy chain master)
+    # share connection, so requests to them are queued on one socket
+    # (first target pin/timeout are used for connection)
+    rv, connections = [], {}
+    for target in _iter_valid(targets):
+        if tags and not tags & target.tags:
+            continue
+        address = target.address
+        target_mode = (
+            target.mode or (detect_mode(address) if mode == 'auto' else mode))
+        endpoint = (target_mode, get_endpoint(target_mode, address))
+        connection = connections.get(endpoint)
+        if connection is not None:
+            rv.append((connection, target.display_id))
+            continue
+        target_kwargs = dict(kwargs, pin=pins.get(
+            address, pins.get(address.split(':')[0], pin)))
+        if target.pin is not None:
+            target_kwargs['pin'] = target.pin
+        if target.timeout is not None:
+            target_kwargs['timeout'] = target.timeout
+        connection = connections[endpoint] = MDC(
+            address, target_mode, **target_kwargs)
+        rv.append((connection, target.display_id))
+    if not rv and not tags and not ctx.meta.get('samsung_mdc.targetless'):
+        raise click.BadParameter('Target list is empty.', param_hint='TARGET')
+    return rv
+
+
+def _get_event_loop():
+    # Returns loop and flag if loop is already running (and shouldn't be closed)
     if platform.system() == 'Windows':
         asyncio.set_event_loop_policy(
             asyncio.WindowsSelectorEventLoopPolicy())
     try:
-        loop = asyncio.get_running_loop()
-        is_running_loop = True
+        return asyncio.get_running_loop(), True
     except RuntimeError:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        is_running_loop = False
+        return loop, False
+
+
+def asyncio_run_coroutine(coroutine):
+    loop, is_running_loop = _get_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        if not is_running_loop:
+            loop.close()
 
-    loop.run_until_complete(asyncio.wait([
-        loop.create_task(call(*target))
-        for target in targets
-    ]))
+
+def asyncio_run(call, targets, verbose=False, concurrency=None):
+    asyncio_run_targets(
+        lambda targets: fan_out(call, targets, concurrency), targets, verbose)
+
+
+def _on_unreachable(unreachable, verbose, connection, display_id, exc):
+    unreachable.append((connection, display_id, exc))
+    print(f'{display_id}@{connection.target}',
+          f'Unreachable: {exc.__class__.__name__}: {exc}')
+    if verbose:
+        print_exception(exc)
+
+
+def asyncio_run_targets(run, targets, verbose=False):
+    # Awaits run(targets) coroutine function processing targets
+    # (only reachable ones with --preconnect), then closes connections
+    ctx = click.get_current_context(silent=True)
+    preconnect_concurrency = ctx and ctx.obj and ctx.obj.get('preconnect')
+    loop, is_running_loop = _get_event_loop()
+
+    async def run_targets():
+        live = targets
+        if preconnect_concurrency:
+            live = await preconnect(
+                targets, preconnect_concurrency, partial(
+                    _on_unreachable, ctx.obj['unreachable'], verbose))
+            if len(live) < len(targets):
+                print('Unreachable targets:', len(targets) - len(live))
+        return await run(live)
+
+    rv = loop.run_until_complete(run_targets())
 
     async def close(connection):
         try:
@@ -543,7 +769,9 @@ def asyncio_run(call, targets, verbose=False):
                 print_exception(exc)
 
     # Gracefully close connections
-    connections = [target[0] for target in targets if target[0].is_opened]
+    connections = {
+        id(target[0]): target[0] for target in targets if target[0].is_opened
+    }.values()
     if connections:
         loop.run_until_complete(asyncio.wait([
             loop.create_task(close(connection))
@@ -553,6 +781,12 @@ def asyncio_run(call, targets, verbose=False):
     if not is_running_loop:
         loop.close()
 
+    tls_sessions = MDC.tls_session_cache
+    if verbose and tls_sessions.handshakes:
+        print('TLS handshakes:', tls_sessions.handshakes,
+              'resumed:', tls_sessions.resumed)
+    return rv
+
 
 def register_command(command):
     @click.pass_context
@@ -560,6 +794,14 @@ def register_command(command):
         mdc_call = ctx.command.create_mdc_call(kwargs)
         failed_targets = []
 
+        if ctx.obj['processes']:
+            for ok, output in run_sharded(
+                    ShardCall(mdc_call, ctx.obj['verbose']),
+                    ctx.obj['targets'], ctx.obj['processes']):
+                print(output, end='')
+                if not ok:
+                    failed_targets.append(None)
+
         async def call(connection, display_id):
             try:
                 await mdc_call(connection, display_id)
@@ -568,7 +810,8 @@ def register_command(command):
                 if ctx.obj['verbose']:
                     print_exception(exc)
 
-        asyncio_run(call, ctx.obj['targets'], ctx.obj['verbose'])
+        if not ctx.obj['processes']:
+            asyncio_run(call, ctx.obj['targets'], ctx.obj['verbose'])
 
         if failed_targets:
             if len(ctx.obj['targets']) > 1:
@@ -665,7 +908,10 @@ def script(ctx, script_file, sleep, retry_command, retry_command_sleep,
 
     def create_disconnect():
         async def disconnect(connection, display_id):
-            await connection.close()
+            # Connection shared with other targets running script
+            # is kept open for them
+            await connection.release()
+            connection.acquire()
             return tuple()
         disconnect.name = 'disconnect'
         disconnect.args = []
@@ -718,6 +964,17 @@ def script(ctx, script_file, sleep, retry_command, retry_command_sleep,
     failed_targets = []
 
     async def call(connection, display_id):
+        connection.acquire()
+        try:
+            await run_script(connection, display_id)
+        finally:
+            try:
+                await connection.release()
+            except Exception as exc:
+                if ctx.obj['verbose']:
+                    print_exception(exc)
+
+    async def run_script(connection, display_id):
         last_exc = None
         for retry_script_i in range(retry_script + 1):
             if retry_script_i and retry_script_sleep:
@@ -798,3 +1055,727 @@ def raw(ctx, command, data):
         if len(ctx.obj['targets']) > 1:
             print('Failed targets:', len(failed_targets))
         ctx.exit(1)
+
+
+DISCOVER_HELP = """
+Discover displays with MDC port open in NETWORK (example: 10.0.0.0/16)
+or single IP addresses.
+
+Prints ADDRESS:PORT, TLS/PLAIN ("Secured Protocol" enabled or not)
+and SERIAL_NUMBER MODEL_NAME SOFTWARE_VERSION if --identify option
+provided (TLS displays are identified only if --pin provided).
+
+Detected TLS mode is remembered in --tls-cache file if provided.
+
+\b
+Example: samsung-mdc --tls-cache tls.json discover -o targets.txt 10.0.0.0/16
+"""
+
+
+@cli.command(help=DISCOVER_HELP, cls=TargetlessSubcommand)
+@click.option('--port', default=1515, type=int,
+              help='MDC port (default: 1515)')
+@click.option('-t', '--timeout', default=1, type=float,
+              help='Connect/read timeout in seconds (default: 1)')
+@click.option('-c', '--concurrency', default=1000, type=int,
+              help='Max open sockets (default: 1000)')
+@click.option('-i', '--identify', is_flag=True,
+              help='Request serial number, model name and software version')
+@click.option('-d', '--display-id', default=0, type=int,
+              help='DISPLAY_ID for --identify and --output (default: 0)')
+@click.option('-o', '--output', default=None, type=click.File('w'),
+              help='Write discovered targets to file')
+@click.argument('network', nargs=-1, required=True, cls=ArgumentWithHelp,
+                help='Network (IP/PREFIX) or IP address')
+@click.pass_context
+def discover(ctx, network, port, timeout, concurrency, identify,
+             display_id, output):
+    from ipaddress import ip_network
+    from .discovery import discover
+
+    for value in network:
+        try:
+            ip_network(value, strict=False)
+        except ValueError as exc:
+            raise click.BadParameter(str(exc), param_hint='NETWORK')
+
+    tls_cache = ctx.obj['tls_cache']
+
+    def callback(result):
+        print(f'{result.address}:{result.port}',
+              'TLS' if result.tls else 'PLAIN',
+              *(_repr(value) for value in result.info.values()))
+        if output:
+            output.write(f'{display_id}@{result.address}:{result.port}\n')
+        if tls_cache is not None:
+            tls_cache.set(f'{result.address}:{result.port}', result.tls)
+
+    asyncio_run_coroutine(discover(
+        network, callback, port=port, timeout=timeout,
+        concurrency=concurrency, identify=identify, display_id=display_id,
+        pin=ctx.obj['pin']))
+
+
+INVENTORY_HELP = """
+Refresh and show inventory of static facts (serial number, model,
+software version, network configuration) stored in local SQLite database.
+
+Only facts older than TTL (per command) are requested from displays,
+so report for whole fleet is rendered from database on subsequent runs.
+
+\b
+Default TTL (seconds):
+{ttl}
+
+\b
+Example: samsung-mdc ./targets.txt inventory --db fleet.db --ttl model_name 0
+"""
+
+
+@cli.command(
+    help=INVENTORY_HELP.format(ttl='\n'.join(
+        f'{name} {ttl}' for name, ttl in DEFAULT_TTL.items())),
+    cls=FixedSubcommand)
+@click.option('--db', default='samsung-mdc-inventory.db',
+              type=click.Path(dir_okay=False),
+              help='SQLite database (default: samsung-mdc-inventory.db)')
+@click.option('--ttl', multiple=True, nargs=2, type=(str, float),
+              metavar='COMMAND SECONDS',
+              help='Override TTL for command (may be any GET command)')
+@click.option('--offline', is_flag=True,
+              help='Show report from database without refresh')
+@click.pass_context
+def inventory(ctx, db, ttl, offline):
+    from .inventory import Inventory
+
+    ttl = {**DEFAULT_TTL, **dict(ttl)}
+    for name in ttl:
+        if name not in MDC._commands or not MDC._commands[name].GET:
+            raise click.BadParameter(f'Unknown GET command: {name}',
+                                     param_hint='--ttl')
+
+    targets = [(connection.target, display_id)
+               for connection, display_id in ctx.obj['targets']]
+    connections = {
+        (connection.target, display_id): connection
+        for connection, display_id in ctx.obj['targets']
+    }
+
+    with Inventory(db) as store:
+        stale = [] if offline else store.get_stale(targets, ttl)
+        facts, failed_targets = [], []
+
+        async def call(connection, display_id, commands):
+            failed = False
+            for name in commands:
+                try:
+                    value = await getattr(connection, name)(display_id)
+                except Exception as exc:
+                    facts.append((connection.target, display_id, name,
+                                  None, f'{exc.__class__.__name__}: {exc}'))
+                    if not isinstance(exc, NAKError):
+                        # Not available, so no reason to continue
+                        failed = True
+                        break
+                else:
+                    facts.append((connection.target, display_id, name,
+                                  value, None))
+            if failed:
+                failed_targets.append((connection, display_id))
+
+        if stale:
+            asyncio_run(call, [
+                (connections[target, display_id], display_id, commands)
+                for target, display_id, commands in stale
+            ], ctx.obj['verbose'])
+            # Facts of unavailable targets are not saved,
+            # so they are requested next time
+            failed = {(c.target, d) for c, d in failed_targets}
+            store.update(fact for fact in facts if fact[:2] not in failed)
+
+        for target, display_id, values in store.get_facts(targets, ttl):
+            print(f'{display_id}@{target}', *(
+                f'{name}=' + (
+                    ','.join(map(str, values[name][0]))
+                    if name in values and values[name][1] is None
+                    else '-')
+                for name in ttl))
+
+    if failed_targets:
+        print('Failed targets:', len(failed_targets))
+        ctx.exit(1)
+
+
+CLOCK_SYNC_HELP = """
+Set display clock to local time on all targets.
+
+Round trip time is measured for each target before sync, and request is
+sent just in time to be received on next second boundary (minute for
+displays supporting only CLOCK_M), so clocks are not drifting
+by connection and request time.
+
+Prints used command, round trip time and residual clock skew
+(display minus local time, measured with display clock precision).
+"""
+
+
+@cli.command(name='clock-sync', help=CLOCK_SYNC_HELP, cls=FixedSubcommand)
+@click.option('-c', '--concurrency', default=None, type=int,
+              help='Max targets processed at once (default: unlimited)')
+@click.option('--samples', default=3, type=int,
+              help='Round trip time measure requests (default: 3)')
+@click.pass_context
+def clock_sync(ctx, concurrency, samples):
+    from .clock import sync_clock
+
+    failed_targets = []
+
+    async def call(connection, display_id):
+        try:
+            result = await sync_clock(connection, display_id, samples)
+        except Exception as exc:
+            print(f'{display_id}@{connection.target}',
+                  f'{exc.__class__.__name__}: {exc}')
+            failed_targets.append((connection, display_id, exc))
+            if ctx.obj['verbose']:
+                print_exception(exc)
+        else:
+            print(f'{display_id}@{connection.target}', result.command.name,
+                  f'rtt={result.rtt:.3f}', f'skew={result.skew:+.3f}')
+
+    asyncio_run(call, ctx.obj['targets'], ctx.obj['verbose'], concurrency)
+
+    if failed_targets:
+        if len(ctx.obj['targets']) > 1:
+            print('Failed targets:', len(failed_targets))
+        ctx.exit(1)
+
+
+def load_data_file(file):
+    # YAML (or JSON, which is YAML subset) file content
+    content = file.read()
+    if file.name.endswith('.json'):
+        import json
+        return json.loads(content)
+    try:
+        import yaml
+    except ImportError:
+        raise click.UsageError(
+            'PyYAML is required for YAML files (pip install pyyaml)')
+    return yaml.safe_load(content)
+
+
+def _to_cli_arg(value):
+    # Converting YAML value to command line argument
+    if isinstance(value, bool):
+        # Enum fields are not accepting bool, but "on" is parsed as True
+        return str(int(value))
+    if isinstance(value, (list, tuple)):
+        return ','.join(map(str, value))
+    if value is None:
+        return ''
+    return str(value)
+
+
+def parse_settings(ctx, settings):
+    """
+    Converts {command: data} mapping (using CLI arguments conversion)
+    to list of reconcile.Setting.
+
+    Data may be single value, list of values or mapping by DATA field
+    names. For commands with parametrized CMD (timers) data is
+    {TIMER_ID: data} mapping.
+    """
+    from .reconcile import Setting
+
+    if not isinstance(settings or {}, dict):
+        raise click.UsageError('settings: expected {command: data}')
+    rv = []
+    for name, value in (settings or {}).items():
+        command = cli.commands.get(name)
+        if (not isinstance(command, MDCClickCommand)
+           or not command.mdc_command.SET):
+            raise click.UsageError(f'Unknown SET command: {name}')
+        mdc_command = command.mdc_command
+
+        if isinstance(mdc_command.CMD, fields.Field):
+            if not isinstance(value, dict):
+                raise click.UsageError(
+                    f'{name}: expected {{{mdc_command.CMD.name}: data}}')
+            items = [([cmd_arg], data) for cmd_arg, data in value.items()]
+        else:
+            items = [([], value)]
+
+        for cmd_args, data in items:
+            if isinstance(data, dict):
+                try:
+                    data = [data[field.name] for field in mdc_command.DATA]
+                except KeyError as exc:
+                    raise click.UsageError(f'{name}: missing {exc}')
+            elif not isinstance(data, list):
+                data = [data]
+            args = list(map(_to_cli_arg, cmd_args + data))
+
+            ctx.params.clear()
+            try:
+                command.parse_args(ctx, args)
+                args = tuple(ctx.params.values())
+                if cmd_args:
+                    setting = Setting(mdc_command, args[:1], args[1:])
+                else:
+                    setting = Setting(mdc_command, (), args)
+                mdc_command.pack_payload_data(setting.data)
+            except (click.UsageError, ValueError, TypeError) as exc:
+                raise click.UsageError(f'{name}: {exc}')
+            rv.append(setting)
+    return rv
+
+
+APPLY_HELP = """
+Apply desired state from YAML (or JSON) file.
+
+Current state is requested with fewest GET requests
+(STATUS and VIDEO are used for several commands at once),
+and only changed settings are applied (power first).
+Changes (current -> desired) are printed before applying.
+
+Commands without GET support or with different GET response
+format are always applied.
+
+\b
+Format (values are same as command arguments):
+settings:  # for all targets
+  power: on
+  input_source: hdmi1
+  weekly_restart: {WEEKDAY: [mon, fri], TIME: "03:00"}
+  timer_15:
+    1: ["08:00", on, "20:00", on, everyday, [], everyday, [], 10, hdmi1, 0]
+groups:  # for targets matching DISPLAY_ID@TARGET patterns
+  - targets: ["*@10.0.1.*"]
+    settings:
+      osd_menu_orientation: portrait_90
+
+NOTE: quote time values, YAML is parsing unquoted 08:00 as number.
+"""
+
+
+@cli.command(help=APPLY_HELP, cls=FixedSubcommand)
+@click.option('-c', '--concurrency', default=None, type=int,
+              help='Max targets processed at once (default: unlimited)')
+@click.option('--dry-run', is_flag=True,
+              help='Only show changes, do not apply')
+@click.argument('state_file', type=click.File(), cls=ArgumentWithHelp,
+                help='YAML (or JSON) file with desired state.')
+@click.pass_context
+def apply(ctx, state_file, concurrency, dry_run):
+    from fnmatch import fnmatch
+    from . import reconcile
+
+    state = load_data_file(state_file) or {}
+    if not isinstance(state, dict):
+        raise click.UsageError('expected {settings: ..., groups: [...]}')
+    settings = parse_settings(ctx, state.get('settings'))
+    groups = []
+    for i, group in enumerate(state.get('groups') or []):
+        if not isinstance(group, dict):
+            raise click.UsageError(
+                f'groups[{i}]: expected {{targets: [...], settings: ...}}')
+        patterns = group.get('targets')
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        if not patterns or not isinstance(patterns, list) or not all(
+                isinstance(pattern, str) for pattern in patterns):
+            raise click.UsageError(
+                f'groups[{i}]: expected targets patterns list')
+        groups.append((patterns, parse_settings(ctx, group.get('settings'))))
+
+    def get_settings(name):
+        rv = {(s.command.name, s.args): s for s in settings}
+        for patterns, group_settings in groups:
+            if any(fnmatch(name, pattern) for pattern in patterns):
+                rv.update({(s.command.name, s.args): s
+                           for s in group_settings})
+        return list(rv.values())
+
+    failed_targets = []
+
+    async def call(connection, display_id):
+        name = f'{display_id}@{connection.target}'
+        try:
+            changes = await reconcile.plan(
+                connection, display_id, get_settings(name))
+            for change in changes:
+                print(name, ' '.join([change.command.name, *map(
+                    str, change.args)]),
+                    '?' if change.current is None else _repr(change.current),
+                    '->', _repr(change.data))
+            if not changes:
+                print(name, 'Up to date')
+            elif not dry_run:
+                await reconcile.apply(connection, display_id, changes)
+                print(name, 'Applied:', len(changes))
+        except Exception as exc:
+            print(name, f'{exc.__class__.__name__}: {exc}')
+            failed_targets.append((connection, display_id, exc))
+            if ctx.obj['verbose']:
+                print_exception(exc)
+
+    asyncio_run(call, ctx.obj['targets'], ctx.obj['verbose'], concurrency)
+
+    if failed_targets:
+        if len(ctx.obj['targets']) > 1:
+            print('Failed targets:', len(failed_targets))
+        ctx.exit(1)
+
+
+SCHEDULE_SYNC_HELP = """
+Synchronize timers and holidays with YAML (or JSON) file.
+
+All timers and holidays are read with two pipelined requests batches,
+and only changed timers and holidays are written with one more batch.
+Timer version (TIMER_15/TIMER_13) is detected by response length.
+Without SCHEDULE_FILE current schedule is printed.
+
+\b
+Format (timer values are same as command arguments):
+timer_15:  # or timer_13, timers not listed are left untouched
+  1: ["08:00", on, "20:00", on, everyday, [], everyday, [], 10, hdmi1, 0]
+holidays:  # [START_MONTH, START_DAY, END_MONTH, END_DAY], replaced if set
+  - [12, 24, 12, 26]
+"""
+
+
+@cli.command(name='schedule-sync', help=SCHEDULE_SYNC_HELP,
+             cls=FixedSubcommand)
+@click.option('-c', '--concurrency', default=None, type=int,
+              help='Max targets processed at once (default: unlimited)')
+@click.option('--dry-run', is_flag=True,
+              help='Only show changes, do not write')
+@click.argument('schedule_file', type=click.File(), required=False,
+                cls=ArgumentWithHelp,
+                help='YAML (or JSON) file with desired schedule.')
+@click.pass_context
+def schedule_sync(ctx, schedule_file, concurrency, dry_run):
+    from .schedule import read_schedule, plan_schedule, write_schedule
+
+    timers, holidays = [], None
+    if schedule_file:
+        schedule = load_data_file(schedule_file) or {}
+        holidays = schedule.pop('holidays', None)
+        unknown = set(schedule) - {'timer_15', 'timer_13'}
+        if unknown:
+            raise click.UsageError(f'Unknown schedule keys: {unknown}')
+        timers = parse_settings(ctx, schedule)
+
+        holiday_set = MDC._commands['holiday_set']
+        try:
+            holidays = holidays and [tuple(map(int, x)) for x in holidays]
+            for holiday in holidays or []:
+                holiday_set.pack_payload_data(
+                    [holiday_set.HOLIDAY_MANAGE.ADD, *holiday])
+        except (ValueError, TypeError, IndexError) as exc:
+            raise click.UsageError(f'holidays: {exc}')
+
+    failed_targets = []
+
+    async def call(connection, display_id):
+        name = f'{display_id}@{connection.target}'
+        try:
+            schedule = await read_schedule(connection, display_id)
+            if not schedule_file:
+                for timer_id, data in schedule.timers.items():
+                    print(name, schedule.timer_command.name, timer_id,
+                          _repr(data))
+                for holiday in schedule.holidays:
+                    print(name, 'holiday', _repr(holiday))
+                return
+
+            changes = plan_schedule(schedule, timers, holidays)
+            for change in changes:
+                print(name, ' '.join([change.command.name, *map(
+                    str, change.args)]),
+                    '?' if change.current is None else _repr(change.current),
+                    '->', _repr(change.data))
+            if not changes:
+                print(name, 'Up to date')
+            elif not dry_run:
+                await write_schedule(connection, display_id, changes)
+                print(name, 'Written:', len(changes))
+        except Exception as exc:
+            print(name, f'{exc.__class__.__name__}: {exc}')
+            failed_targets.append((connection, display_id, exc))
+            if ctx.obj['verbose']:
+                print_exception(exc)
+
+    asyncio_run(call, ctx.obj['targets'], ctx.obj['verbose'], concurrency)
+
+    if failed_targets:
+        if len(ctx.obj['targets']) > 1:
+            print('Failed targets:', len(failed_targets))
+        ctx.exit(1)
+
+
+VIDEOWALL_HELP = """
+Set up video wall on all targets at once.
+
+Targets are wall panels ordered left to right, top to bottom
+(SERIAL is position in targets list), so targets count should
+match wall SIZE (COLUMNSxROWS, example: 4x2).
+
+Video wall state is turned ON and video wall model (and mode if set)
+is applied if differs, then settings are read back for verification.
+"""
+
+
+@cli.command(help=VIDEOWALL_HELP, cls=FixedSubcommand)
+@click.option('-c', '--concurrency', default=None, type=int,
+              help='Max targets processed at once (default: unlimited)')
+@click.option('--mode', type=click.Choice(['natural', 'full'],
+                                          case_sensitive=False),
+              help='Video wall mode (default: left untouched)')
+@click.argument('size', cls=ArgumentWithHelp,
+                help='Wall size as COLUMNSxROWS (example: 4x2).')
+@click.pass_context
+def videowall(ctx, size, concurrency, mode):
+    from .videowall import get_settings, setup_panel
+
+    match = re.fullmatch(r'(\d+)[x,](\d+)', size.lower())
+    if not match:
+        raise click.BadParameter('expected COLUMNSxROWS', param_hint='SIZE')
+    columns, rows = map(int, match.groups())
+    targets = ctx.obj['targets']
+    if len(targets) != columns * rows:
+        raise click.UsageError(
+            f'{columns}x{rows} wall requires {columns * rows} targets, '
+            f'got {len(targets)}')
+    try:
+        get_settings(columns, rows, 1, mode)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint='SIZE')
+    serials = {
+        (id(connection), display_id): serial
+        for serial, (connection, display_id) in enumerate(targets, 1)
+    }
+
+    failed_targets = []
+
+    async def call(connection, display_id):
+        name = f'{display_id}@{connection.target}'
+        serial = serials[id(connection), display_id]
+        try:
+            changes, failed = await setup_panel(
+                connection, display_id,
+                get_settings(columns, rows, serial, mode))
+        except Exception as exc:
+            print(name, f'{exc.__class__.__name__}: {exc}')
+            failed_targets.append((connection, display_id, exc))
+            if ctx.obj['verbose']:
+                print_exception(exc)
+            return
+        if failed:
+            print(name, f'serial={serial}', 'Verification failed:',
+                  ' '.join(setting.command.name for setting in failed))
+            failed_targets.append((connection, display_id, None))
+        else:
+            print(name, f'serial={serial}', 'Applied:', len(changes))
+
+    asyncio_run(call, targets, ctx.obj['verbose'], concurrency)
+
+    if failed_targets:
+        if len(targets) > 1:
+            print('Failed targets:', len(failed_targets))
+        ctx.exit(1)
+
+
+MACRO_HELP = """
+Send virtual remote keys sequence to all targets at once.
+
+Each key is sent after gap (--gap at least, extended to
+ACK round trip time of previous keys multiplied by factor for slow
+displays, doubled on error), key NAKed by busy display is resent once.
+Learned timing is saved per model with --capabilities option.
+
+\b
+KEY is KEY_CODE name with or without KEY_ (or KEY_CURSOR_) prefix,
+or hex code,
+optionally repeated with *N suffix.
+Example: menu down*3 enter exit
+"""
+
+
+@cli.command(help=MACRO_HELP, cls=FixedSubcommand)
+@click.option('-c', '--concurrency', default=None, type=int,
+              help='Max targets processed at once (default: unlimited)')
+@click.option('--gap', default=None, type=float,
+              help='Min gap between keys in seconds (default: 0.3)')
+@click.option('--gap-factor', default=None, type=float,
+              help='ACK round trip time multiplier for keys gap '
+                   '(default: 2)')
+@click.option('--max-gap', default=None, type=float,
+              help='Max gap between keys in seconds (default: 2)')
+@click.argument('keys', nargs=-1, required=True, cls=ArgumentWithHelp,
+                help='Keys sequence.')
+@click.pass_context
+def macro(ctx, keys, concurrency, gap, gap_factor, max_gap):
+    from . import remote
+
+    try:
+        keys = remote.parse_keys(keys)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint='KEYS')
+    pacer = remote.KeyPacer(
+        factor=gap_factor or remote.GAP_FACTOR,
+        min_gap=remote.MIN_GAP if gap is None else gap,
+        max_gap=max_gap or remote.MAX_GAP)
+    failed_targets = []
+
+    async def call(connection, display_id):
+        name = f'{display_id}@{connection.target}'
+        try:
+            await remote.send_keys(connection, display_id, keys, pacer)
+        except Exception as exc:
+            print(name, f'{exc.__class__.__name__}: {exc}')
+            failed_targets.append((connection, display_id, exc))
+            if ctx.obj['verbose']:
+                print_exception(exc)
+        else:
+            gap = pacer.get_gap(await pacer.get_key(connection, display_id))
+            print(name, 'Sent:', len(keys), f'gap={gap:.3f}')
+
+    asyncio_run(call, ctx.obj['targets'], ctx.obj['verbose'], concurrency)
+    if ctx.obj['capabilities'] is not None:
+        pacer.save(ctx.obj['capabilities'])
+
+    if failed_targets:
+        if len(ctx.obj['targets']) > 1:
+            print('Failed targets:', len(failed_targets))
+        ctx.exit(1)
+
+
+ROLLOUT_HELP = """
+Staged rollout of SET command to targets in waves.
+
+Command is sent to canary targets first, then to waves growing
+--growth times each (1, 2, 4, 8... targets by default).
+Each target is verified by reading value back (if command supports GET
+with same response format). Rollout is aborted if failure rate
+(errors, NAKs and failed verifications) of wave exceeds
+--max-failure-rate, so remaining targets are left untouched.
+
+Example: samsung-mdc targets.txt rollout --canary 2 launcher_url_address
+"http://example.com/"
+"""
+
+
+@cli.command(help=ROLLOUT_HELP, cls=FixedSubcommand,
+             context_settings={'ignore_unknown_options': True})
+@click.option('--canary', default=1, type=click.IntRange(1),
+              help='Targets in first wave (default: 1)')
+@click.option('--growth', default=2, type=click.FloatRange(1),
+              help='Wave size multiplier (default: 2)')
+@click.option('--max-failure-rate', default=0,
+              type=click.FloatRange(0, 1),
+              help='Max failed part of wave to continue (default: 0)')
+@click.option('-c', '--concurrency', default=None, type=int,
+              help='Max targets processed at once in wave '
+                   '(default: unlimited)')
+@click.argument('command', cls=ArgumentWithHelp,
+                help='SET command name.')
+@click.argument('args', nargs=-1, type=click.UNPROCESSED,
+                cls=ArgumentWithHelp, help='Command arguments.')
+@click.pass_context
+def rollout(ctx, command, args, canary, growth, max_failure_rate,
+            concurrency):
+    from .rollout import run_waves, set_and_verify
+
+    name = command
+    command = cli.commands.get(name.lower())
+    if not isinstance(command, MDCClickCommand):
+        raise click.BadParameter(f'Unknown command: {name}',
+                                 param_hint='COMMAND')
+    ctx.params.clear()
+    command.parse_args(ctx, list(args))
+    mdc_args = command.get_mdc_args(ctx.params)
+    if not mdc_args:
+        raise click.UsageError(f'{command.name}: data required')
+    mdc_command = command.mdc_command
+
+    async def call(connection, display_id):
+        try:
+            rv = await set_and_verify(
+                connection, display_id, mdc_command, *mdc_args)
+        except Exception as exc:
+            print(f'{display_id}@{connection.target}',
+                  f'{exc.__class__.__name__}: {exc}')
+            if ctx.obj['verbose']:
+                print_exception(exc)
+            raise
+        print(f'{display_id}@{connection.target}', _repr(rv))
+
+    def on_wave(wave):
+        print(f'Wave {wave.number}:', len(wave.items), 'targets,',
+              len(wave.failed), 'failed,', len(wave.naks), 'NAK')
+
+    waves, aborted = asyncio_run_targets(lambda targets: run_waves(
+        call, targets, canary, growth, max_failure_rate,
+        concurrency, on_wave), ctx.obj['targets'], ctx.obj['verbose'])
+    if aborted:
+        processed = sum(len(wave.items) for wave in waves)
+        print('Rollout aborted, targets left untouched:',
+              len(ctx.obj['targets']) - len(ctx.obj['unreachable'])
+              - processed)
+        ctx.exit(1)
+
+
+REPLAY_HELP = """
+Replay requests from capture file (see --capture option)
+against captured responses, with captured response delays.
+
+Prints parsed responses (or parse errors) and round trip time,
+so production failures and timing may be reproduced locally.
+"""
+
+
+@cli.command(help=REPLAY_HELP, cls=TargetlessSubcommand)
+@click.option('--speed', default=1, type=click.FloatRange(0),
+              help='Response delays divider, 0 for no delays (default: 1)')
+@click.option('-t', '--timeout', default=5, type=float,
+              help='Response timeout in seconds (default: 5)')
+@click.argument('capture_file', type=click.Path(exists=True, dir_okay=False),
+                cls=ArgumentWithHelp, help='Capture file.')
+@click.pass_context
+def replay(ctx, capture_file, speed, timeout):
+    from .capture import ReplayMDC, read_capture, replay
+
+    targets = {}
+    try:
+        for record in read_capture(capture_file):
+            targets.setdefault(record.target, []).append(record)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint='CAPTURE_FILE')
+
+    failed = []
+
+    async def replay_target(target, records):
+        def callback(display_id, name, response, rtt):
+            if isinstance(response, Exception):
+                failed.append(response)
+                response = f'{response.__class__.__name__}: {response}'
+            else:
+                response = _repr(response)
+            print(f'{display_id}@{target}', name, response,
+                  f'rtt={rtt:.3f}')
+
+        mdc = ReplayMDC(target, records, speed, timeout=timeout,
+                        verbose=ctx.obj['verbose'])
+        await replay(mdc, records, callback)
+
+    async def run():
+        await asyncio.gather(*(
+            replay_target(target, records)
+            for target, records in targets.items()))
+
+    asyncio_run_coroutine(run())
+    if failed:
+        print('Failed requests:', len(failed))
+        ctx.exit(1)
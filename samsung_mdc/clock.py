@@ -0,0 +1,68 @@
+from collections import namedtuple
+from datetime import datetime
+from math import ceil
+from time import time
+import asyncio
+
+from . import MDC
+from .exceptions import NAKError
+
+
+ClockSyncResult = namedtuple('ClockSyncResult', 'command rtt skew')
+
+# Time reserved for packing and sending request before boundary (seconds)
+SEND_MARGIN = 0.05
+
+
+async def measure_clock(mdc, display_id, command, samples=3):
+    """
+    Requests display clock `samples` times, returns minimal round trip time
+    and display clock skew (seconds, precision limited by command).
+    """
+    rtt, skew = None, None
+    for _ in range(samples):
+        started = time()
+        value, = await command(mdc, display_id)
+        elapsed = time() - started
+        if rtt is None or elapsed < rtt:
+            # Display time is assumed to be read in the middle of round trip
+            rtt = elapsed
+            skew = value.timestamp() - (started + elapsed / 2)
+    return rtt, skew
+
+
+async def get_clock_command(mdc, display_id):
+    """
+    Returns CLOCK_S if supported by display, CLOCK_M otherwise.
+    """
+    if mdc.capabilities is not None:
+        return await mdc.resolve_command(display_id, MDC.clock_s, MDC.clock_m)
+    try:
+        await MDC.clock_s(mdc, display_id)
+    except NAKError:
+        return MDC.clock_m
+    return MDC.clock_s
+
+
+async def sync_clock(mdc, display_id, samples=3):
+    """
+    Sets display clock to local time, compensating half of round trip time.
+
+    Request is sent just in time to be received on next second
+    (or minute for CLOCK_M) boundary, since display clock precision
+    doesn't allow to set fractions.
+
+    Returns ClockSyncResult with residual skew measured after sync.
+    """
+    command = await get_clock_command(mdc, display_id)
+    # CLOCK_M is subclass of CLOCK_S, so precision is checked by field
+    precision = 1 if command.DATA[0].seconds else 60
+    rtt, _ = await measure_clock(mdc, display_id, command, samples)
+
+    # Nearest boundary when request may be received by display
+    boundary = ceil((time() + rtt / 2 + SEND_MARGIN) / precision) * precision
+    await asyncio.sleep(max(0, boundary - rtt / 2 - time()))
+    await command(mdc, display_id, [datetime.fromtimestamp(boundary)])
+
+    _, skew = await measure_clock(mdc, display_id, command, 1)
+    return ClockSyncResult(command, rtt, skew)
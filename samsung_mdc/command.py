@@ -3,7 +3,8 @@ from functools import partial, partialmethod
 from enum import Enum
 
 from .fields import Field, Enum as EnumField
-from .exceptions import MDCResponseError, NAKError
+from .exceptions import MDCResponseError, NAKError, MDCUnsupportedCommand
+from .results import Result, create_result
 
 
 class CommandMcs(type):
@@ -34,6 +35,7 @@ class CommandMcs(type):
         ]
 
         cls = type.__new__(mcs, name, bases, dict)
+        cls.Result = create_result(cls)
 
         if cls.GET:
             cls.__call__.__defaults__ = (b'',)
@@ -52,16 +54,44 @@ class Command(metaclass=CommandMcs):
     DATA: List[Union[Type[Enum], Field]]
     RESPONSE_DATA: List[Union[Type[Enum], Field]]
     RESPONSE_EXTRA: List[Union[Type[Enum], Field]]
+    Result: Type[Result]
 
     async def __call__(self, connection, display_id, data):
-        data = self.parse_response(
-            await connection.send(
-                (self.CMD, self.SUBCMD)
-                if self.SUBCMD is not None else self.CMD, display_id,
-                self.pack_payload_data(data) if data else []
-            ),
-        )
-        return tuple(self.parse_response_data(data))
+        return await self.request(
+            connection,
+            (self.CMD, self.SUBCMD) if self.SUBCMD is not None else self.CMD,
+            display_id, data)
+
+    async def request(self, connection, cmd, display_id, data):
+        capabilities, model = connection.capabilities, None
+        if (capabilities is not None
+           and self.name not in capabilities.IDENTITY_COMMANDS):
+            model = await capabilities.get_model(connection, display_id)
+            if capabilities.is_supported(model, self.name) is False:
+                raise MDCUnsupportedCommand(self.name, model)
+
+        data = self.pack_payload_data(data) if data else b''
+
+        async def request():
+            return self.make_result(self.parse_response_data(
+                self.parse_response(
+                    await connection.send(cmd, display_id, data))))
+
+        try:
+            if self.GET and not data:
+                # Identical GET requests in flight are sharing one response
+                rv = await connection.request((cmd, display_id, data), request)
+            else:
+                rv = await request()
+        except NAKError:
+            # Only GET is remembered as unsupported, since SET is
+            # NAKed for invalid data as well
+            if model is not None and self.GET and not data:
+                capabilities.set_supported(model, self.name, False)
+            raise
+        if model is not None:
+            capabilities.set_supported(model, self.name, True)
+        return rv
 
     def __get__(self, connection, cls):
         # Allow Command to be bounded as instance method
@@ -93,7 +123,18 @@ class Command(metaclass=CommandMcs):
         if data[cursor:]:
             # Not consumed data left
             raise MDCResponseError('Unparsed data left', data[cursor:])
-        return tuple(rv)
+        return cls.Result(*rv)
+
+    @classmethod
+    def make_result(cls, values):
+        # Result record if values are matching RESPONSE_DATA
+        # (custom parse_response_data may return other values)
+        if isinstance(values, cls.Result):
+            return values
+        values = tuple(values)
+        if len(values) == len(cls.RESPONSE_DATA):
+            return cls.Result(*values)
+        return values
 
     @classmethod
     def pack_payload_data(cls, data):
@@ -929,14 +929,8 @@ class TIMER_15(Command):
     ]
 
     async def __call__(self, connection, display_id, timer_id, data):
-        cmd = self._TIMER_ID_CMD[timer_id - 1]
-        data = self.parse_response(
-            await connection.send(
-                cmd, display_id,
-                self.pack_payload_data(data) if data else []
-            ),
-        )
-        return self.parse_response_data(data)
+        return await self.request(
+            connection, self._TIMER_ID_CMD[timer_id - 1], display_id, data)
 
     @classmethod
     def parse_response_data(cls, data, *args, _timer_version_check=True,
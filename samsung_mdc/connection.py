@@ -1,17 +1,36 @@
 from typing import Union, Sequence, Tuple
-from functools import partial
+from functools import lru_cache
 from enum import Enum
 import asyncio
+import socket
+import threading
 
 from .exceptions import MDCResponseError, MDCReadTimeoutError, \
     MDCTimeoutError, MDCTLSRequired, MDCTLSAuthFailed
 from .utils import repr_hex
+from .tls import (
+    TLSSessionCache, TLSTargetCache, get_ssl_context, target_key,
+    _resume_session)
+from .targets import DNSCache
 
 
 HEADER_CODE = 0xAA
 RESPONSE_CMD = 0xFF
 ACK_CODE = ord('A')  # 0x41 65
 NAK_CODE = ord('N')  # 0x4E 78
+# Max bytes skipped searching for response frame (few max frames)
+MAX_RESYNC_SKIP = 1024
+# Max frames without data cached by pack_payload
+FRAME_CACHE_SIZE = 4096
+# Directions of captured frames
+SENT, RECEIVED = 0, 1
+# StreamReader limit (bytes buffered before reading is paused),
+# max frame is 260 bytes, so asyncio default of 64 KiB is not needed
+READ_LIMIT = 1024
+# Unanswered TCP keepalive probes before connection is dropped by OS
+KEEPALIVE_PROBES = 3
+# Cheap GET request used as heartbeat (POWER)
+HEARTBEAT_CMD = 0x11
 
 
 def get_checksum(payload):
@@ -34,22 +53,64 @@ def _normalize_cmd(
     return int(cmd[0]), None if cmd[1] is None else int(cmd[1])
 
 
+class FrameBuilder:
+    """
+    Builds frames in reusable buffer with checksum calculated
+    while writing, so only resulting bytes are allocated.
+    Not thread-safe, use instance per thread.
+    """
+    def __init__(self):
+        # header, cmd, display_id, length, max data, checksum
+        self._buffer = bytearray(4 + 255 + 1)
+
+    def build(self, cmd, subcmd, display_id, data):
+        buffer = self._buffer
+        length = len(data) + (subcmd is not None)
+        if length > 255:
+            raise ValueError('Data length exceeded', length)
+        buffer[0], buffer[1], buffer[2], buffer[3] = (
+            HEADER_CODE, cmd, display_id, length)
+        checksum = cmd + display_id + length
+        cursor = 4
+        if subcmd is not None:
+            buffer[4] = subcmd
+            checksum += subcmd
+            cursor = 5
+        buffer[cursor:cursor + len(data)] = data
+        checksum += sum(data)
+        cursor += len(data)
+        buffer[cursor] = checksum % 256
+        # Copy is returned, because transport may keep reference to it
+        return bytes(memoryview(buffer)[:cursor + 1])
+
+
+_frame_builder = threading.local()
+
+
+@lru_cache(maxsize=FRAME_CACHE_SIZE)
+def _pack_cached(cmd, subcmd, display_id):
+    return _pack(cmd, subcmd, display_id, b'')
+
+
+def _pack(cmd, subcmd, display_id, data):
+    try:
+        builder = _frame_builder.builder
+    except AttributeError:
+        builder = _frame_builder.builder = FrameBuilder()
+    return builder.build(cmd, subcmd, display_id, data)
+
+
 def pack_payload(
     cmd: Union[int, Tuple[int], Tuple[int, Union[int, None]]],
     display_id: int,
     data: Union[bytes, Sequence] = b''
 ):
     cmd, subcmd = _normalize_cmd(cmd)
-    data = bytes(data)
-    if subcmd is not None:
-        data = bytes([subcmd]) + data
-
-    payload = (
-        bytes([HEADER_CODE, cmd, display_id, len(data)])
-        + bytes(data)
-    )
-    payload += bytes([get_checksum(payload[1:])])
-    return payload
+    if not len(data):
+        # Frames without data (like polling GET requests) are built once,
+        # others (mostly one-off SET requests) are not evicting them
+        return _pack_cached(cmd, subcmd, display_id)
+    return _pack(cmd, subcmd, display_id, bytes(data))
 
 
 def pack_response(
@@ -65,8 +126,8 @@ def pack_response(
             'Data should contain only error code for NAK response', data)
 
     data = bytes(data)
-    if subcmd is not None and ack:
-        # subcmd is not sent on NAK in response
+    if subcmd and ack:
+        # subcmd is not sent on NAK (and zero one at all) in response
         data = bytes([subcmd]) + data
 
     return pack_payload(
@@ -89,28 +150,116 @@ async def wait_for_read(reader, count, timeout, reason):
         raise MDCReadTimeoutError(reason, bytes(reader._buffer)) from exc
 
 
+def _is_response_to(resp, cmd, subcmd, display_id):
+    # Response frame is for request cmd/subcmd and display_id
+    # (subcmd is not sent on NAK, and zero subcmd is not sent at all)
+    if len(resp) < 7 or resp[2] != display_id or resp[5] != cmd:
+        return False
+    if subcmd and resp[4] == ACK_CODE:
+        return len(resp) > 7 and resp[6] == subcmd
+    return True
+
+
 class CONNECTION_MODE(Enum):
     TCP = 'tcp'
     SERIAL = 'serial'
 
 
+class _TLSTargetCacheAttribute:
+    # MDCConnection.tls_target_cache: shared default_tls_target_cache
+    # on class, tls_cache (if provided) on connection
+    def __get__(self, connection, cls):
+        if connection is None or connection._tls_target_cache is None:
+            return cls.default_tls_target_cache
+        return connection._tls_target_cache
+
+    def __set__(self, connection, cache):
+        connection._tls_target_cache = cache
+
+
 class MDCConnection:
-    reader, writer = None, None
+    # Connections may be kept open for whole fleet (tens of thousands),
+    # so instances have no __dict__ (subclasses without __slots__ do)
+    __slots__ = (
+        'target', 'mode', 'connection_kwargs', 'coalesce', 'resync',
+        'resync_skipped', 'tls', 'pins', '_tls_target_cache',
+        'tls_detect_timeout', 'capabilities', 'capture', 'timeout',
+        'connect_timeout', 'verbose', 'read_limit', 'reader', 'writer',
+        'keepalive', 'nodelay', 'heartbeat',
+        '_inflight', '_lock', '_desynced', '_heartbeat_task',
+        '_last_activity', '_last_display_id', '_users',
+    )
+    # Shared by all connections in process unless overridden
+    tls_session_cache = TLSSessionCache()
+    default_tls_target_cache = TLSTargetCache()
+    tls_target_cache = _TLSTargetCacheAttribute()
+    # Hostnames pre-resolved with DNSCache.resolve_all
+    dns_cache = DNSCache()
 
     def __init__(self, target, mode=CONNECTION_MODE.TCP, timeout=5,
-                 connect_timeout=None, verbose=False, **connection_kwargs):
+                 connect_timeout=None, verbose=False, coalesce=True,
+                 resync=False, tls=None, pins=None, tls_cache=None,
+                 tls_detect_timeout=1, capabilities=None, capture=None,
+                 read_limit=READ_LIMIT, keepalive=None, nodelay=True,
+                 heartbeat=None, **connection_kwargs):
         self.target = target
+        self.reader, self.writer = None, None
         self.mode = CONNECTION_MODE(mode)
         self.connection_kwargs = connection_kwargs
+        self.coalesce = coalesce
+        # Created on first coalesced request
+        self._inflight = None
+        self._lock = None
+        self._desynced = False
+        # Skip corrupted frames and garbage in stream instead of failing
+        self.resync = resync
+        self.resync_skipped = 0
+
+        # TLS is started if pin provided, or detected on connect in "auto"
+        # mode using pin (or pin from pins mapping by target)
+        if tls not in (None, 'auto'):
+            raise ValueError('tls should be None or "auto"', tls)
+        self.tls = tls
+        self.pins = pins or {}
+        self._tls_target_cache = tls_cache
+        self.tls_detect_timeout = tls_detect_timeout
+
+        # See capabilities.CapabilityCache
+        self.capabilities = capabilities
+        # See capture.CaptureWriter
+        self.capture = capture
 
         self.timeout = timeout
         self.connect_timeout = connect_timeout or timeout
-        self.verbose = (
-            partial(print, self.target) if verbose is True else verbose)
+        # Callable(*args), or any true value to print with target
+        self.verbose = verbose
+        self.read_limit = read_limit
+
+        # TCP keepalive idle time (and probes interval) in seconds,
+        # so OS drops half-open connection to rebooted display
+        self.keepalive = keepalive
+        self.nodelay = nodelay
+        # Idle time in seconds to send heartbeat request after
+        # (to last used display_id), connection is reopened if it fails
+        self.heartbeat = heartbeat
+        self._heartbeat_task = None
+        self._last_activity = None
+        self._last_display_id = None
+        # Callers sharing connection (see acquire/release)
+        self._users = 0
+
+    def _log(self, *args):
+        if callable(self.verbose):
+            self.verbose(*args)
+        else:
+            print(self.target, *args)
 
     async def open(self):
         connection_kwargs = self.connection_kwargs.copy()
-        pin = connection_kwargs.pop('pin', None)
+        connection_kwargs.setdefault('limit', self.read_limit)
+        pin = self.pins.get(
+            target_key(self.target), connection_kwargs.pop('pin', None))
+        tls = pin is not None
 
         if self.mode == CONNECTION_MODE.TCP:
             if isinstance(self.target, (list, tuple)):
@@ -120,14 +269,27 @@ class MDCConnection:
                 target, *port = self.target.split(':')
                 port = port and int(port[0]) or 1515
             connection_kwargs.setdefault('port', port)
+            target = self.dns_cache.get(target)
 
             self.reader, self.writer = \
                 await wait_for(
                     asyncio.open_connection(target, **connection_kwargs),
                     self.connect_timeout, 'Connect timeout')
+            self._set_socket_options(
+                self.writer.transport.get_extra_info('socket'))
 
             if self.verbose:
-                self.verbose('Connected')
+                self._log('Connected')
+
+            if self.tls == 'auto':
+                try:
+                    tls = await self._detect_tls()
+                except Exception:
+                    await self.close()
+                    raise
+                if tls and pin is None:
+                    await self.close()
+                    raise MDCTLSRequired('PIN required')
 
         else:
             # Make this package optional
@@ -143,15 +305,109 @@ class MDCConnection:
                     self.connect_timeout, 'Connect timeout')
 
             if self.verbose:
-                self.verbose('Connected')
+                self._log('Connected')
 
-        if pin is not None:
+        if tls:
             try:
                 await self._start_tls(pin)
             except Exception:
                 await self.close()
                 raise
 
+        self._last_activity = asyncio.get_event_loop().time()
+        if self.heartbeat and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.ensure_future(
+                self._run_heartbeat())
+
+    def _set_socket_options(self, sock):
+        if sock is None:
+            return
+        sock.setsockopt(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.nodelay))
+        if self.keepalive is None:
+            return
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Options are platform specific (TCP_KEEPALIVE on macOS)
+        idle = getattr(socket, 'TCP_KEEPIDLE',
+                       getattr(socket, 'TCP_KEEPALIVE', None))
+        for option, value in (
+            (idle, self.keepalive),
+            (getattr(socket, 'TCP_KEEPINTVL', None), self.keepalive),
+            (getattr(socket, 'TCP_KEEPCNT', None), KEEPALIVE_PROBES),
+        ):
+            if option is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, option, int(value))
+
+    async def _run_heartbeat(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            idle = loop.time() - self._last_activity
+            if idle < self.heartbeat:
+                await asyncio.sleep(self.heartbeat - idle)
+                continue
+            self._last_activity = loop.time()
+            if not self.is_opened:
+                # Closed after failed reconnect, started again on open
+                self._heartbeat_task = None
+                return
+            if self._last_display_id is None:
+                # Nothing to check until first request
+                continue
+            display_id = self._last_display_id
+            try:
+                await self._send(
+                    pack_payload(HEARTBEAT_CMD, display_id),
+                    [(HEARTBEAT_CMD, None, display_id)])
+            except asyncio.CancelledError:
+                # Stopped by close (CancelledError is Exception on 3.7)
+                raise
+            except Exception as exc:
+                if self.verbose:
+                    self._log('Heartbeat failed:', repr(exc))
+                try:
+                    await self._reopen()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    # Will be opened again on next send
+                    if self.verbose:
+                        self._log('Reconnect failed:', repr(exc))
+
+    async def _reopen(self):
+        async with self._lock:
+            if self.is_opened:
+                await self.close()
+            await self.open()
+
+    @property
+    def is_half_closed(self):
+        """
+        Connection was closed or reset by display (or dropped by
+        TCP keepalive), so it should be reopened before sending.
+        """
+        return self.reader is not None and (
+            self.reader.at_eof() or self.reader.exception() is not None)
+
+    async def _detect_tls(self):
+        # Display with "Secured Protocol" enabled sends header right after
+        # connect, so waiting for it on unknown (or known TLS) targets
+        known = self.tls_target_cache.get(self.target)
+        if known is False:
+            return False
+        try:
+            resp = await asyncio.wait_for(
+                self.reader.read(15),
+                self.timeout if known else self.tls_detect_timeout)
+        except asyncio.TimeoutError:
+            resp = b''
+        # Returning header back to stream to be read on TLS start
+        self.reader._buffer[:0] = resp
+        tls = bool(resp) and b'MDCSTART<<TLS>>'.startswith(resp)
+        self.tls_target_cache.set(self.target, tls)
+        if self.verbose:
+            self._log('TLS detected' if tls else 'TLS not detected')
+        return tls
+
     async def _start_tls(self, pin):
         if isinstance(pin, int):
             pin = str(pin).rjust(4, '0').encode()
@@ -160,7 +416,6 @@ class MDCConnection:
 
         assert self.is_opened
 
-        import ssl
         resp = await wait_for_read(self.reader, 15, self.timeout,
                                    'TLS header read timeout')
         if not resp == b'MDCSTART<<TLS>>':
@@ -169,17 +424,19 @@ class MDCConnection:
         transport = self.writer.transport
         protocol = transport.get_protocol()
         loop = asyncio.get_event_loop()
-        ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        ssl_ctx.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
-        ssl_ctx.check_hostname = False
-        ssl_ctx.verify_mode = ssl.VerifyMode.CERT_NONE
-        ssl_transport = await loop.start_tls(
-            transport, protocol, ssl_ctx)
+        token = _resume_session.set(self.tls_session_cache.get(self.target))
+        try:
+            ssl_transport = await loop.start_tls(
+                transport, protocol, get_ssl_context())
+        finally:
+            _resume_session.reset(token)
         self.writer._transport = ssl_transport
         self.reader._transport = ssl_transport
+        ssl_object = ssl_transport.get_extra_info('ssl_object')
 
         if self.verbose:
-            self.verbose('TLS established')
+            self._log('TLS established' + (
+                ' (session resumed)' if ssl_object.session_reused else ''))
 
         self.writer.write(pin)
         await wait_for(self.writer.drain(), self.timeout,
@@ -202,8 +459,12 @@ class MDCConnection:
             raise MDCResponseError('Unexpected TLS auth response',
                                    resp + self.reader._buffer)
 
+        # Session tickets are received after handshake (TLSv1.3),
+        # so session is stored after first response
+        self.tls_session_cache.update(self.target, ssl_object)
+
         if self.verbose:
-            self.verbose('TLS authentication passed')
+            self._log('TLS authentication passed')
 
     @property
     def is_opened(self):
@@ -222,18 +483,150 @@ class MDCConnection:
     ):
         cmd, subcmd = _normalize_cmd(cmd)
         payload = pack_payload((cmd, subcmd), display_id, data)
+        return (await self._send(payload, [(cmd, subcmd, display_id)]))[0]
 
-        if not self.is_opened:
-            await self.open()
-        assert (self.reader is not None and self.writer is not None)
+    async def send_batch(
+        self,
+        requests: Sequence[Tuple[
+            Union[int, Tuple[int], Tuple[int, int]], int,
+            Union[bytes, Sequence]
+        ]]
+    ):
+        """
+        Pipelined send of requests [(cmd, display_id, data), ...]:
+        all request frames are written at once and responses are read
+        in same order, so batch costs one round trip instead of one per
+        request. Returns list of responses (same as send returns).
+
+        Note: on NAK display still responds to every request in batch,
+        but on response timeout whole batch is failed.
+        """
+        payload, expected = b'', []
+        for cmd, display_id, data in requests:
+            cmd, subcmd = _normalize_cmd(cmd)
+            payload += pack_payload((cmd, subcmd), display_id, data)
+            expected.append((cmd, subcmd, display_id))
+        if not expected:
+            return []
+        return await self._send(payload, expected)
+
+    async def _send(self, payload, expected):
+        if self._lock is None:
+            # Created lazily, so connection may be created outside of loop
+            self._lock = asyncio.Lock()
+
+        # MDC is request-response protocol without request identifiers,
+        # so only one request (or batch) may be in flight on connection
+        async with self._lock:
+            if self.is_half_closed:
+                if self.verbose:
+                    self._log('Connection lost, reconnecting')
+                await self.close()
+            if not self.is_opened:
+                await self.open()
+            self._last_display_id = expected[-1][2]
+            assert (self.reader is not None and self.writer is not None)
+            if self._desynced:
+                self._discard_buffered()
+
+            try:
+                rv = await self._write_and_receive(payload, expected)
+            except (asyncio.CancelledError, asyncio.TimeoutError,
+                    MDCResponseError):
+                # Response may be partially read, corrupted or
+                # may arrive later, so next response should be searched
+                # for in stream
+                self._desynced = True
+                raise
+            self._last_activity = asyncio.get_event_loop().time()
+            return rv
+
+    def _discard_buffered(self):
+        # Late responses to timed out (or cancelled) requests received
+        # so far are dropped, so they are not taken for next response
+        buffered = bytes(self.reader._buffer)
+        if buffered:
+            if self.capture is not None:
+                self.capture.write(RECEIVED, self.target, buffered)
+            self.reader._buffer.clear()
+            self.reader._maybe_resume_transport()
+            if self.verbose:
+                self._log('Discard', repr_hex(buffered))
 
+    async def _write_and_receive(self, payload, expected):
         self.writer.write(payload)
+        if self.capture is not None:
+            self.capture.write(SENT, self.target, payload)
         await wait_for(self.writer.drain(), self.timeout, 'Write timeout')
         if self.verbose:
-            self.verbose('Sent', repr_hex(payload))
+            self._log('Sent', repr_hex(payload))
+
+        try:
+            return [
+                await self._receive(cmd, subcmd, display_id)
+                for cmd, subcmd, display_id in expected
+            ]
+        except MDCTLSRequired:
+            if self.tls != 'auto':
+                raise
+            # Remembered as plain target, but "Secured Protocol"
+            # was enabled since, so reconnecting with TLS
+            self.tls_target_cache.set(self.target, True)
+            await self.close()
+            await self.open()
+            return await self._write_and_receive(payload, expected)
+
+    async def _receive(self, cmd, subcmd, display_id):
+        skipped = 0
+        while True:
+            resp = await self._read_response(display_id)
+            if not _is_response_to(resp, cmd, subcmd, display_id):
+                if not (self._desynced or self.resync):
+                    raise MDCResponseError('Unexpected response', resp)
+                # Response to cancelled or timed out request
+                # (arrived after buffered responses were discarded)
+                if self.verbose:
+                    self._log('Skip stale', repr_hex(resp))
+                skipped += len(resp)
+                if skipped > MAX_RESYNC_SKIP:
+                    raise MDCResponseError('Unexpected responses', resp)
+                continue
+            self._desynced = False
+            break
+
+        ack, rcmd, data = resp[4], resp[5], resp[6:-1]
+        if ack not in (ACK_CODE, NAK_CODE):
+            raise MDCResponseError('Unexpected ACK/NAK', resp)
+
+        if subcmd and ack == ACK_CODE:
+            # rsubcmd is not sent on NAK (see _is_response_to)
+            rsubcmd = data[0]
+            data = data[1:]
+        else:
+            rsubcmd = None
+
+        return (
+            ack == ACK_CODE,
+            (rcmd,) if rsubcmd is None else (rcmd, rsubcmd),
+            data
+        )
 
+    async def _read_response(self, display_id):
+        # Consumed bytes are captured before validation,
+        # so garbage and corrupted frames may be replayed as well
+        raw = bytearray()
+        try:
+            if self.resync or self._desynced:
+                return await self._search_response(display_id, raw)
+            return await self._read_frame(display_id, raw)
+        finally:
+            if self.capture is not None and raw:
+                self.capture.write(RECEIVED, self.target, bytes(raw))
+
+    async def _read_frame(self, display_id, raw):
         resp = await wait_for_read(self.reader, 4, self.timeout,
                                    'Response header read timeout')
+        raw += resp
         if not resp:
             raise MDCResponseError('Empty response', resp)
         if resp[0] != HEADER_CODE:
@@ -249,39 +642,119 @@ class MDCConnection:
                                    resp + self.reader._buffer)
 
         length = resp[3]
-        resp += await wait_for_read(self.reader, length + 1, self.timeout,
-                                    'Response data read timeout')
+        data = await wait_for_read(self.reader, length + 1, self.timeout,
+                                   'Response data read timeout')
+        raw += data
+        resp += data
         if self.verbose:
-            self.verbose('Recv', repr_hex(resp))
+            self._log('Recv', repr_hex(resp))
 
         checksum = get_checksum(resp[1:-1])
         if checksum != int(resp[-1]):
             raise MDCResponseError('Checksum failed', resp)
-
-        ack, rcmd, data = resp[4], resp[5], resp[6:-1]
-        if ack not in (ACK_CODE, NAK_CODE):
-            raise MDCResponseError('Unexpected ACK/NAK', resp)
-
-        if subcmd and ack == ACK_CODE:
-            # rsubcmd is not sent on NAK
-            rsubcmd = data[0]
-            data = data[1:]
-        else:
-            rsubcmd = None
-
-        return (
-            ack == ACK_CODE,
-            (rcmd,) if rsubcmd is None else (rcmd, rsubcmd),
-            data
-        )
+        return resp
+
+    async def _search_response(self, display_id, raw):
+        # Skipping bytes till plausible response frame:
+        # header, response cmd, display_id, length and valid checksum
+        resp, skipped = b'', 0
+        while True:
+            if len(resp) >= 4 and (
+                resp[0] != HEADER_CODE or resp[1] != RESPONSE_CMD
+                or resp[2] != display_id
+            ):
+                if not skipped and (
+                    resp + self.reader._buffer == b'MDCSTART<<TLS>>'
+                ):
+                    raise MDCTLSRequired(resp + self.reader._buffer)
+                shift = resp.find(HEADER_CODE, 1)
+                if shift < 0:
+                    shift = len(resp)
+                resp, skipped = resp[shift:], skipped + shift
+            elif len(resp) >= 4 and len(resp) >= resp[3] + 5:
+                length = resp[3] + 5
+                if get_checksum(resp[1:length - 1]) == resp[length - 1]:
+                    break
+                resp, skipped = resp[1:], skipped + 1
+            else:
+                required = max(4, len(resp) >= 4 and resp[3] + 5)
+                chunk = await wait_for_read(
+                    self.reader, required - len(resp), self.timeout,
+                    'Response read timeout')
+                raw += chunk
+                if not chunk:
+                    raise MDCResponseError('Empty response', resp)
+                resp += chunk
+
+            if skipped > MAX_RESYNC_SKIP:
+                raise MDCResponseError('Resync failed', resp)
+
+        if len(resp) > length:
+            # Returning bytes after frame back to stream
+            self.reader._buffer[:0] = resp[length:]
+            del raw[len(raw) - len(resp) + length:]
+            resp = resp[:length]
+
+        if skipped:
+            self.resync_skipped += skipped
+            if self.verbose:
+                self._log(f'Resync: {skipped} bytes skipped')
+        if self.verbose:
+            self._log('Recv', repr_hex(resp))
+        return resp
+
+    async def request(self, key, request):
+        """
+        Awaits request() coroutine function result.
+
+        If coalescing is enabled and request with same key
+        (cmd, subcmd, display_id, data) is already in flight,
+        result (or exception) of that request is shared instead,
+        so concurrent identical requests cost one round trip.
+        """
+        if not self.coalesce:
+            return await request()
+
+        if self._inflight is None:
+            self._inflight = {}
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(request())
+            self._inflight[key] = future
+            future.add_done_callback(
+                lambda _: self._inflight.pop(key, None))
+        # Cancellation of one waiter should not cancel request for others
+        return await asyncio.shield(future)
+
+    def acquire(self):
+        """
+        Marks connection as used by one more caller, like targets
+        with different display_id behind same endpoint (serial gateway
+        or daisy chain master), see release.
+        """
+        self._users += 1
+
+    async def release(self):
+        """
+        Closes connection when it's released by all callers.
+        """
+        self._users = max(self._users - 1, 0)
+        if not self._users and self.is_opened:
+            await self.close()
 
     async def close(self):
+        if (self._heartbeat_task is not None
+           and self._heartbeat_task is not asyncio.current_task()):
+            # Heartbeat reconnecting is not stopping itself
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
         if self.is_tls_started:
             # FIX warning
             # "returning true from eof_received() has no effect when using ssl"
             self.writer._protocol.eof_received = lambda: None
         writer = self.writer
         self.reader, self.writer = None, None
+        self._desynced = False
         writer.close()
         await wait_for(writer.wait_closed(), self.timeout, 'Close timeout')
 
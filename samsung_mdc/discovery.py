@@ -0,0 +1,105 @@
+from collections import namedtuple
+from ipaddress import ip_network
+import asyncio
+
+from . import MDC
+from .connection import wait_for
+from .exceptions import NAKError
+from .fleet import fan_out
+
+
+TLS_HEADER = b'MDCSTART<<TLS>>'
+IDENTIFY_COMMANDS = ('serial_number', 'model_name', 'software_version')
+
+Discovered = namedtuple('Discovered', 'address port tls info')
+
+
+def iter_hosts(networks):
+    """
+    Yields host addresses from networks (like "10.0.0.0/16")
+    or single addresses, lazily.
+    """
+    for network in networks:
+        network = ip_network(network, strict=False)
+        if network.num_addresses == 1:
+            yield str(network.network_address)
+        else:
+            yield from map(str, network.hosts())
+
+
+async def probe(address, port=1515, timeout=1, identify=False,
+                display_id=0, pin=None):
+    """
+    Connects to address and detects if MDC port is open and
+    if "Secured Protocol" (TLS) is enabled.
+
+    If identify is set, IDENTIFY_COMMANDS are requested using same
+    connection (only plain or TLS with pin provided), info contains
+    their values (None if failed).
+
+    Returns Discovered or None if port is not open
+    (or connection is reset right after connect).
+    """
+    try:
+        reader, writer = await wait_for(
+            asyncio.open_connection(address, port), timeout,
+            'Connect timeout')
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+    mdc = MDC(f'{address}:{port}', timeout=timeout)
+    mdc.reader, mdc.writer = reader, writer
+    try:
+        # Display with "Secured Protocol" enabled sends header on connect
+        try:
+            resp = await asyncio.wait_for(reader.read(len(TLS_HEADER)),
+                                          timeout)
+        except asyncio.TimeoutError:
+            resp = b''
+        except OSError:
+            return None
+        tls = bool(resp) and TLS_HEADER.startswith(resp)
+
+        info = {}
+        if identify and (not tls or pin is not None):
+            info = dict.fromkeys(IDENTIFY_COMMANDS)
+            try:
+                if tls:
+                    # Returning header to stream for TLS start
+                    reader._buffer[:0] = resp
+                    await mdc._start_tls(pin)
+                for name in IDENTIFY_COMMANDS:
+                    try:
+                        info[name], = await getattr(mdc, name)(display_id)
+                    except NAKError:
+                        pass
+            except Exception:
+                # Not answering (wrong display_id?), connection reset,
+                # TLS required or not MDC at all
+                pass
+        return Discovered(address, port, tls, info)
+    finally:
+        try:
+            await mdc.close()
+        except Exception:
+            pass
+
+
+async def discover(networks, callback, port=1515, timeout=1,
+                   concurrency=1000, **probe_kwargs):
+    """
+    Probes all hosts in networks concurrently (no more than `concurrency`
+    sockets open at once), calls callback(Discovered) for each host with
+    MDC port open.
+    """
+    async def call(address):
+        try:
+            result = await probe(address, port, timeout, **probe_kwargs)
+        except Exception:
+            # Host failing unexpectedly should not abort whole scan
+            result = None
+        if result is not None:
+            callback(result)
+
+    await fan_out(call, ((address,) for address in iter_hosts(networks)),
+                  concurrency)
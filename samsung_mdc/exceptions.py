@@ -42,3 +42,27 @@ class NAKError(MDCError):
 
     def __str__(self):
         return f'Negative Acknowledgement [error_code {self.error_code}]'
+
+
+class MDCUnsupportedCommand(NAKError):
+    # Raised without request if command is known to be not supported
+    # by device model (see capabilities.CapabilityCache)
+    def __init__(self, command, model):
+        self.command = command
+        self.model = model
+        super().__init__(None)
+        self.args = (command, model)
+
+    def __str__(self):
+        return f'Command {self.command} is not supported by {self.model}'
+
+
+class MDCVerificationError(MDCError):
+    # Value read back after SET differs from value set
+    def __init__(self, current, data):
+        self.current = current
+        self.data = data
+        super().__init__(current, data)
+
+    def __str__(self):
+        return f'Verification failed: {self.current} != {self.data}'
@@ -175,10 +175,10 @@ class VideoWallModel(Field):
 
     def pack(self, data):
         if isinstance(data, str):
-            rv = tuple(int(x) for x in data.split(','))
+            data = tuple(int(x) for x in data.split(','))
         elif not isinstance(data, (tuple, list)):
             raise TypeError('Video wall model must be Tuple[int, int] or'
                             'comma-separated string')
-        if not len(rv) == 2:
+        if not len(data) == 2 or not all(0 <= x < 16 for x in data):
             raise ValueError('Invalid video wall model', data)
-        return pack_videowall_model(rv)
+        return pack_videowall_model(data)
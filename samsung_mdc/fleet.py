@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+import asyncio
+import io
+import os
+import sys
+
+
+# Output buffer of current call in worker process (see run_sharded)
+_output = ContextVar('output', default=None)
+
+# Max items processed by worker process at once
+SHARD_SIZE = 1000
+
+
+async def fan_out(call, items, concurrency=None):
+    """
+    Awaits call(*item) for every item, running at most `concurrency`
+    calls at once (unlimited if not set).
+
+    Items may be lazy iterator (consumed only as workers are free),
+    so large target lists are not materialized in memory.
+    Exceptions are not handled, so call should handle them itself.
+    """
+    if not concurrency:
+        await asyncio.gather(*(call(*item) for item in items))
+        return
+
+    items = iter(items)
+
+    async def worker():
+        for item in items:
+            await call(*item)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def preconnect(targets, concurrency=None, on_failed=None):
+    """
+    Opens connections of (connection, display_id, ...) targets, running
+    at most `concurrency` connects (including TLS authentication)
+    at once, so command phase deals only with live sessions.
+
+    Connection shared by targets is opened once.
+    on_failed(connection, display_id, exception) is called
+    for targets of connections failed to open.
+    Returns list of targets with opened connections.
+    """
+    targets = list(targets)
+    failed = {}
+
+    async def connect(connection):
+        if connection.is_opened:
+            return
+        try:
+            await connection.open()
+        except Exception as exc:
+            failed[id(connection)] = exc
+
+    connections = {id(target[0]): target[0] for target in targets}
+    await fan_out(connect, [(c,) for c in connections.values()],
+                  concurrency)
+
+    rv = []
+    for target in targets:
+        exc = failed.get(id(target[0]))
+        if exc is None:
+            rv.append(target)
+        elif on_failed:
+            on_failed(target[0], target[1], exc)
+    return rv
+
+
+class _CallStdout:
+    # Writes to output buffer of current call if set,
+    # so output of concurrent calls is not interleaved
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    def write(self, text):
+        buffer = _output.get()
+        return (self.stdout if buffer is None else buffer).write(text)
+
+    def flush(self):
+        self.stdout.flush()
+
+
+def _run_shard(call, shard, concurrency=None):
+    # Running in worker process with own event loop
+    if not isinstance(sys.stdout, _CallStdout):
+        sys.stdout = _CallStdout(sys.stdout)
+    results = [None] * len(shard)
+
+    async def shard_call(i, item):
+        buffer = io.StringIO()
+        _output.set(buffer)
+        rv = await call(*item)
+        results[i] = (rv, buffer.getvalue())
+
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(
+            fan_out(shard_call, enumerate(shard), concurrency))
+    finally:
+        loop.close()
+    return results
+
+
+def run_sharded(call, items, processes=None, concurrency=None,
+                shard_size=SHARD_SIZE):
+    """
+    Awaits call(*item) for every item in pool of `processes` worker
+    processes (CPU count by default), each running own event loop
+    with fan_out (`concurrency` is per process).
+
+    Yields (call result, call stdout output) in items order
+    as shards are processed, so output is not interleaved.
+    Call and items should be picklable, and changes made to items
+    in worker processes are not visible to caller.
+    """
+    items = list(items)
+    processes = processes or os.cpu_count() or 1
+    # Sharding to at least one shard per process,
+    # but limiting shard size so results are yielded progressively
+    size = max(min(shard_size, -(-len(items) // processes)), 1)
+    shards = [items[i:i + size] for i in range(0, len(items), size)]
+
+    with ProcessPoolExecutor(min(processes, len(shards)) or 1) as executor:
+        for results in executor.map(
+                partial(_run_shard, call, concurrency=concurrency), shards):
+            yield from results
@@ -0,0 +1,111 @@
+from time import time as now
+import json
+import sqlite3
+
+from .utils import to_jsonable
+
+
+DAY = 24 * 60 * 60
+
+# Static facts and how long (seconds) they are considered fresh
+DEFAULT_TTL = {
+    'serial_number': 30 * DAY,
+    'model_name': 30 * DAY,
+    'model_number': 30 * DAY,
+    'software_version': DAY,
+    'network_configuration': DAY,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    target TEXT NOT NULL,
+    display_id INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    value TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (target, display_id, command)
+) WITHOUT ROWID
+"""
+
+
+class Inventory:
+    """
+    Local SQLite store of command responses (facts) per target,
+    so static facts are requested only when older than TTL.
+
+    Values are stored as JSON (see utils.to_jsonable),
+    failed requests are stored with error to avoid requesting
+    unsupported commands on every refresh.
+    """
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        # WAL allows reading reports while refresh is running
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_stale(self, targets, ttl=DEFAULT_TTL, timestamp=None):
+        """
+        Returns list of (target, display_id, [command names]) for
+        (target, display_id) in targets having facts older than ttl.
+        """
+        timestamp = now() if timestamp is None else timestamp
+        updated = {
+            (target, display_id, command): updated_at
+            for target, display_id, command, updated_at in self.db.execute(
+                'SELECT target, display_id, command, updated_at FROM facts')
+        }
+        rv = []
+        for target, display_id in targets:
+            commands = [
+                command for command, seconds in ttl.items()
+                if updated.get((target, display_id, command), 0)
+                + seconds <= timestamp
+            ]
+            if commands:
+                rv.append((target, display_id, commands))
+        return rv
+
+    def update(self, facts, timestamp=None):
+        """
+        Saves facts in one transaction.
+        facts: iterable of (target, display_id, command, value, error)
+        """
+        timestamp = now() if timestamp is None else timestamp
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO facts '
+                '(target, display_id, command, value, error, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    (target, display_id, command,
+                     None if error else json.dumps(to_jsonable(value)),
+                     error and str(error), timestamp)
+                    for target, display_id, command, value, error in facts
+                ))
+
+    def get_facts(self, targets=None, commands=None):
+        """
+        Yields (target, display_id, {command: (value, error, updated_at)})
+        for targets (all stored if not set), ordered as targets.
+        """
+        rows = self.db.execute(
+            'SELECT target, display_id, command, value, error, updated_at '
+            'FROM facts ORDER BY target, display_id, command')
+        facts = {}
+        for target, display_id, command, value, error, updated_at in rows:
+            if commands is None or command in commands:
+                facts.setdefault((target, display_id), {})[command] = (
+                    value and json.loads(value), error, updated_at)
+        for key in (facts if targets is None else targets):
+            yield key[0], key[1], facts.get(key, {})
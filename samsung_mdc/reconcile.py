@@ -0,0 +1,134 @@
+from collections import namedtuple
+
+from . import MDC
+from .exceptions import NAKError
+
+
+# Desired state of command for display.
+# args are command arguments before data (TIMER_ID for timers)
+Setting = namedtuple('Setting', 'command args data')
+# Setting which differs from current state (None if not known)
+Change = namedtuple('Change', 'command args current data')
+
+# GET commands returning state of several commands at once,
+# {composite: {command: response field index}}
+COMPOSITE_GETS = {
+    'status': {
+        'power': 0, 'volume': 1, 'mute': 2, 'input_source': 3,
+        'picture_aspect': 4,
+    },
+    'video': {
+        'contrast': 0, 'brightness': 1, 'sharpness': 2, 'color': 3,
+        'tint': 4, 'color_tone': 5, 'color_temperature': 6,
+    },
+}
+
+# Commands which should be applied before command (if in same state),
+# power is applied before any other command
+DEPENDENCIES = {
+    'video_wall_mode': ('video_wall_state',),
+    'video_wall_model': ('video_wall_state',),
+}
+
+
+def get_apply_order(names):
+    """
+    Returns command names sorted in order they should be applied
+    (dependencies first, then by command code)
+    """
+    names = set(names)
+    rv = []
+
+    def visit(name):
+        if name in rv:
+            return
+        for dependency in DEPENDENCIES.get(name, ('power',)):
+            if dependency in names and dependency != name:
+                visit(dependency)
+        rv.append(name)
+
+    for name in sorted(names, key=lambda x: MDC._commands[x].get_order()):
+        visit(name)
+    return rv
+
+
+def _is_comparable(command):
+    # State may be compared only if GET response has same fields as SET data
+    return command.GET and (
+        [f.name for f in command.DATA]
+        == [f.name for f in command.RESPONSE_DATA])
+
+
+async def read_state(mdc, display_id, settings):
+    """
+    Returns current state {(command name, args): data} for settings,
+    with fewest GET requests (using COMPOSITE_GETS).
+    State of commands failed with NAK or not comparable is not returned.
+    """
+    names = {setting.command.name for setting in settings}
+    state, requested = {}, set()
+
+    for composite, indexes in COMPOSITE_GETS.items():
+        covered = names.intersection(indexes)
+        if len(covered) < 2:
+            continue
+        try:
+            data = await MDC._commands[composite](mdc, display_id)
+        except NAKError:
+            continue
+        for name in covered:
+            state[name, ()] = (data[indexes[name]],)
+        requested.update(covered)
+
+    for setting in settings:
+        command = setting.command
+        if command.name in requested or not _is_comparable(command):
+            continue
+        try:
+            state[command.name, setting.args] = await command(
+                mdc, display_id, *setting.args)
+        except NAKError:
+            pass
+    return state
+
+
+def _normalize(command, data):
+    # Desired data in same form as current one (like enums instead of
+    # ints), so they are represented same way
+    if not _is_comparable(command):
+        return data
+    try:
+        return command.parse_response_data(command.pack_payload_data(data))
+    except Exception:
+        return data
+
+
+async def plan(mdc, display_id, settings):
+    """
+    Returns list of Change for settings which differ from current state,
+    ordered as they should be applied (with desired data in same form
+    as current data).
+    """
+    state = await read_state(mdc, display_id, settings)
+    order = get_apply_order(setting.command.name for setting in settings)
+    changes = []
+    for setting in sorted(settings, key=lambda x: (
+            order.index(x.command.name), x.args)):
+        command = setting.command
+        current = state.get((command.name, setting.args))
+        if current is not None and (
+            command.pack_payload_data(current)
+            == command.pack_payload_data(setting.data)
+        ):
+            continue
+        changes.append(Change(command, setting.args, current,
+                              _normalize(command, setting.data)))
+    return changes
+
+
+async def apply(mdc, display_id, changes):
+    """
+    Applies changes in order, stops on first error.
+    """
+    for change in changes:
+        await change.command(mdc, display_id, *change.args, change.data)
@@ -0,0 +1,122 @@
+import asyncio
+import re
+
+from . import MDC
+from .exceptions import MDCError, NAKError
+from .tls import target_key
+
+
+# Min gap between keys: display ACKs keys fast, but drops ones
+# sent faster while it's busy with OSD
+MIN_GAP, MAX_GAP = 0.3, 2
+# Gap is extended to learned ACK round trip time multiplied by factor
+GAP_FACTOR = 2
+# Weight of last ACK round trip time in learned one
+EWMA_ALPHA = 0.3
+
+
+def parse_keys(keys):
+    """
+    Converts macro keys (KEY_CODE names with or without KEY_/KEY_CURSOR_
+    prefix, or hex codes, optionally repeated with *N suffix like "down*3")
+    to KEY_CODE list.
+    """
+    key_code = MDC._commands['virtual_remote'].KEY_CODE
+    rv = []
+    for key in keys:
+        match = re.fullmatch(r'(.+?)(?:\*(\d+))?', key.strip())
+        name, repeat = match.group(1).upper(), int(match.group(2) or 1)
+        if name.startswith('0X'):
+            try:
+                code = key_code(int(name, 16))
+            except ValueError:
+                raise ValueError(f'Unknown key code: {key}')
+        else:
+            for candidate in (name, f'KEY_{name}', f'KEY_CURSOR_{name}'):
+                if candidate in key_code.__members__:
+                    code = key_code[candidate]
+                    break
+            else:
+                raise ValueError(f'Unknown key: {key}')
+        rv.extend([code] * repeat)
+    return rv
+
+
+class KeyPacer:
+    """
+    Paces virtual remote keys with gap display can handle.
+
+    Gap is min_gap at least, extended for slow displays to ACK round
+    trip time (EWMA) of previous keys multiplied by factor,
+    and doubled on failure. It's learned per model if capabilities
+    are used (and persisted with them), per target otherwise.
+    """
+    def __init__(self, factor=GAP_FACTOR, min_gap=MIN_GAP, max_gap=MAX_GAP):
+        self.factor, self.min_gap, self.max_gap = factor, min_gap, max_gap
+        # key: learned ACK round trip time
+        self._rtt = {}
+        # key: gap after failure
+        self._backoff = {}
+
+    async def get_key(self, connection, display_id):
+        capabilities = connection.capabilities
+        if capabilities is not None:
+            model = await capabilities.get_model(connection, display_id)
+            if model is not None:
+                if model not in self._rtt:
+                    self._rtt[model] = capabilities.get(model, 'key_rtt')
+                return model
+        return (target_key(connection.target), display_id)
+
+    def get_gap(self, key):
+        gap = max(self.min_gap, self._backoff.get(key, 0))
+        rtt = self._rtt.get(key)
+        if rtt is not None:
+            gap = max(gap, rtt * self.factor)
+        return min(gap, self.max_gap)
+
+    def update(self, key, rtt):
+        if self._rtt.get(key) is not None:
+            rtt = EWMA_ALPHA * rtt + (1 - EWMA_ALPHA) * self._rtt[key]
+        self._rtt[key] = rtt
+
+    def backoff(self, key):
+        self._backoff[key] = min(self.get_gap(key) * 2, self.max_gap)
+
+    def save(self, capabilities):
+        for key, rtt in self._rtt.items():
+            if isinstance(key, str) and rtt is not None:
+                capabilities.set(key, 'key_rtt', round(rtt, 4))
+
+
+async def send_keys(mdc, display_id, keys, pacer=None):
+    """
+    Sends KEY_CODE list with virtual remote, waiting for gap
+    after each ACK before next key. Key NAKed by busy display is resent
+    once after doubled gap, stops on other errors.
+    """
+    pacer = pacer or KeyPacer()
+    command = MDC._commands['virtual_remote']
+    loop = asyncio.get_event_loop()
+    key = await pacer.get_key(mdc, display_id)
+
+    for i, code in enumerate(keys):
+        if i:
+            await asyncio.sleep(pacer.get_gap(key))
+        for retry in (False, True):
+            start = loop.time()
+            try:
+                await command(mdc, display_id, (code,))
+            except NAKError:
+                pacer.backoff(key)
+                if retry:
+                    raise
+                # Unlike timed out key, NAKed one is not applied,
+                # so it's safe to resend it
+                await asyncio.sleep(pacer.get_gap(key))
+                continue
+            except (MDCError, asyncio.TimeoutError):
+                pacer.backoff(key)
+                raise
+            pacer.update(key, loop.time() - start)
+            break
@@ -0,0 +1,122 @@
+from array import array
+from collections import namedtuple
+import json
+
+from . import fields
+from .utils import to_jsonable, pack_bitmask, parse_enum_bitmask
+
+
+class Result(tuple):
+    """
+    Base of command response record (Command.Result),
+    namedtuple with RESPONSE_DATA field names.
+    """
+    __slots__ = ()
+    # Original field names (namedtuple renames not valid identifiers)
+    _names = ()
+
+    def as_dict(self):
+        return dict(zip(self._names, self))
+
+    def to_json(self, **kwargs):
+        return json.dumps(to_jsonable(self.as_dict()), **kwargs)
+
+
+def create_result(command):
+    """
+    Returns Result namedtuple class for command RESPONSE_DATA
+    """
+    names = [field.name for field in command.RESPONSE_DATA]
+    base = namedtuple('Result', names, rename=True)
+    return type('Result', (base, Result), {
+        '__slots__': (),
+        '__module__': command.__module__,
+        '__qualname__': f'{command.__name__}.Result',
+        '_names': tuple(names),
+    })
+
+
+def _get_typecode(field):
+    # array typecode for field values stored as integers
+    if isinstance(field, fields.Int) and field.length <= 8:
+        return {1: 'B', 2: 'H', 3: 'L', 4: 'L'}.get(field.length, 'Q')
+    if isinstance(field, (fields.Enum, fields.VideoWallModel)):
+        return 'B'
+    return None
+
+
+class ResultBatch:
+    """
+    Compact columnar container for many results of same command:
+    integer fields (Int, Bool, Enum, Bitmask) are stored in arrays,
+    other fields in lists. Results are rebuilt on access.
+    """
+    def __init__(self, command, results=()):
+        self.command = command
+        self._fields = command.RESPONSE_DATA
+        self._columns = [
+            array(typecode) if typecode else []
+            for typecode in map(_get_typecode, self._fields)
+        ]
+        self.extend(results)
+
+    def append(self, result):
+        if len(result) != len(self._fields):
+            raise ValueError('Result does not match command RESPONSE_DATA',
+                             result)
+        for field, column, value in zip(
+                self._fields, self._columns, result):
+            if isinstance(column, list):
+                column.append(value)
+            elif isinstance(field, fields.Bitmask):
+                column.append(pack_bitmask(value))
+            elif isinstance(field, fields.VideoWallModel):
+                column.append(value[1] * 16 + value[0])
+            else:
+                column.append(int(value))
+
+    def extend(self, results):
+        for result in results:
+            self.append(result)
+
+    def __len__(self):
+        return len(self._columns[0]) if self._columns else 0
+
+    def column(self, name):
+        """
+        Returns raw column values by field name
+        (enum values, bitmask integers, etc for array columns)
+        """
+        for field, column in zip(self._fields, self._columns):
+            if field.name == name:
+                return column
+        raise KeyError(name)
+
+    def _get_value(self, field, column, i):
+        value = column[i]
+        if isinstance(column, list) or (
+           isinstance(field, fields.Int)
+           and not isinstance(field, fields.Bool)):
+            return value
+        if isinstance(field, fields.Bitmask):
+            return parse_enum_bitmask(field.enum, value)
+        # Bool, Enum and VideoWallModel are stored as one byte
+        return field.parse(bytes([value]))[0]
+
+    def __getitem__(self, i):
+        return self.command.Result(*(
+            self._get_value(field, column, i)
+            for field, column in zip(self._fields, self._columns)))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def as_dict(self):
+        """
+        Returns {field name: list of values}
+        """
+        return {
+            field.name: [self._get_value(field, column, i)
+                         for i in range(len(self))]
+            for field, column in zip(self._fields, self._columns)
+        }
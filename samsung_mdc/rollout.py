@@ -0,0 +1,70 @@
+from collections import namedtuple
+from itertools import islice
+
+from .fleet import fan_out
+from .exceptions import NAKError, MDCVerificationError
+from .reconcile import _is_comparable
+
+
+# Processed wave of rollout, failed and naks are lists of items
+Wave = namedtuple('Wave', 'number items failed naks')
+
+
+def iter_waves(items, canary=1, growth=2):
+    """
+    Yields lists of items: canary first, then waves growing
+    `growth` times each (1, 2, 4, 8... by default).
+    """
+    items, size = iter(items), max(canary, 1)
+    while True:
+        wave = list(islice(items, size))
+        if not wave:
+            return
+        yield wave
+        size = max(size + 1, int(size * growth))
+
+
+async def run_waves(call, items, canary=1, growth=2, max_failure_rate=0,
+                    concurrency=None, on_wave=None):
+    """
+    Awaits call(*item) for items in waves (see iter_waves),
+    next wave is started only if failure rate of previous wave
+    (items with exception, including NAK) does not exceed max_failure_rate.
+
+    on_wave(Wave) is called after each wave.
+    Returns list of processed waves and flag if rollout was aborted.
+    """
+    waves = []
+    for number, wave in enumerate(iter_waves(items, canary, growth), 1):
+        failed, naks = [], []
+
+        async def wave_call(*item):
+            try:
+                await call(*item)
+            except NAKError:
+                naks.append(item)
+            except Exception:
+                failed.append(item)
+
+        await fan_out(wave_call, wave, concurrency)
+        waves.append(Wave(number, wave, failed, naks))
+        if on_wave:
+            on_wave(waves[-1])
+        if (len(failed) + len(naks)) / len(wave) > max_failure_rate:
+            return waves, True
+    return waves, False
+
+
+async def set_and_verify(mdc, display_id, command, *args):
+    """
+    Calls SET command and verifies it with GET if command response
+    is same as data (args are command args with data last).
+    Returns SET response.
+    """
+    rv = await command(mdc, display_id, *args)
+    if _is_comparable(command):
+        current = await command(mdc, display_id, *args[:-1])
+        if (command.pack_payload_data(current)
+           != command.pack_payload_data(args[-1])):
+            raise MDCVerificationError(tuple(current), args[-1])
+    return rv
@@ -0,0 +1,117 @@
+from collections import namedtuple
+
+from . import MDC
+from .reconcile import Change
+
+
+TIMER_IDS = range(1, 8)
+
+# Current schedule of display.
+# timer_command is TIMER_15 or TIMER_13 (detected by response length),
+# timers is {TIMER_ID: data},
+# holidays is list of (START_MONTH, START_DAY, END_MONTH, END_DAY)
+Schedule = namedtuple('Schedule', 'timer_command timers holidays')
+
+
+def _get_request_cmd(command, args):
+    # Timers have CMD parametrized by TIMER_ID
+    if command.name in ('timer_15', 'timer_13'):
+        return command._TIMER_ID_CMD[args[0] - 1]
+    return command.CMD
+
+
+async def read_schedule(mdc, display_id):
+    """
+    Returns Schedule of display with two pipelined batches:
+    all timers with holidays count, then all holidays.
+    """
+    timer_15, timer_13, holiday_get = (
+        MDC._commands[name] for name in ('timer_15', 'timer_13',
+                                         'holiday_get'))
+
+    responses = await mdc.send_batch([
+        (_get_request_cmd(timer_15, (timer_id,)), display_id, b'')
+        for timer_id in TIMER_IDS
+    ] + [(holiday_get.CMD, display_id, b'')])
+
+    timer_command, timers = timer_15, {}
+    for timer_id, response in zip(TIMER_IDS, responses):
+        data = timer_15.parse_response(response)
+        timer_command = timer_13 if len(data) == 13 else timer_15
+        timers[timer_id] = timer_command.parse_response_data(data)
+
+    count, = holiday_get.parse_response_data(
+        holiday_get.parse_response(responses[-1]))
+    responses = await mdc.send_batch([
+        (holiday_get.CMD, display_id, holiday_get.pack_payload_data([index]))
+        for index in range(1, count + 1)
+    ])
+    holidays = [
+        holiday_get.parse_response_data(
+            holiday_get.parse_response(response))[1:]
+        for response in responses
+    ]
+    return Schedule(timer_command, timers, holidays)
+
+
+def plan_schedule(schedule, timers=(), holidays=None):
+    """
+    Returns list of reconcile.Change to write for current Schedule
+    to match desired timers (list of reconcile.Setting)
+    and holidays (list of (START_MONTH, START_DAY, END_MONTH, END_DAY)).
+
+    Timers not in desired are left untouched,
+    holidays are replaced if holidays is not None.
+    """
+    changes = []
+    for setting in sorted(timers, key=lambda x: x.args):
+        if setting.command is not schedule.timer_command:
+            raise ValueError(
+                f'{setting.command.name} is not supported by display, '
+                f'use {schedule.timer_command.name} instead')
+        timer_id, = setting.args
+        current = schedule.timers[timer_id]
+        if (setting.command.pack_payload_data(current)
+           != setting.command.pack_payload_data(setting.data)):
+            changes.append(
+                Change(setting.command, setting.args, current, setting.data))
+
+    if holidays is not None:
+        holiday_set = MDC._commands['holiday_set']
+        manage = holiday_set.HOLIDAY_MANAGE
+        current, holidays = set(schedule.holidays), set(map(tuple, holidays))
+        # Deleting first, so display holidays limit is not exceeded
+        changes.extend(
+            Change(holiday_set, (), None, (manage.DELETE, *holiday))
+            for holiday in sorted(current - holidays))
+        changes.extend(
+            Change(holiday_set, (), None, (manage.ADD, *holiday))
+            for holiday in sorted(holidays - current))
+    return changes
+
+
+async def write_schedule(mdc, display_id, changes):
+    """
+    Writes changes (from plan_schedule) with one pipelined batch,
+    raises NAKError if any of changes failed.
+    """
+    responses = await mdc.send_batch([
+        (_get_request_cmd(change.command, change.args), display_id,
+         change.command.pack_payload_data(change.data))
+        for change in changes
+    ])
+    for change, response in zip(changes, responses):
+        change.command.parse_response(response)
+
+
+async def sync_schedule(mdc, display_id, timers=(), holidays=None,
+                        dry_run=False):
+    """
+    Reads display schedule and writes only changed timers and holidays.
+    Returns list of changes.
+    """
+    changes = plan_schedule(
+        await read_schedule(mdc, display_id), timers, holidays)
+    if changes and not dry_run:
+        await write_schedule(mdc, display_id, changes)
+    return changes
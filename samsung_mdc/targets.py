@@ -0,0 +1,223 @@
+from collections import namedtuple
+import asyncio
+import csv
+import ipaddress
+import json
+import re
+import socket
+
+from .fleet import fan_out
+from .tls import target_key
+
+
+# Target loaded from targets file, mode/pin/timeout are None
+# if not set for target (detected or global ones are used)
+Target = namedtuple('Target', 'mode address display_id pin timeout tags')
+
+MODES = ('tcp', 'serial')
+# CSV columns / JSONL keys, other ones (like comments) are ignored
+FIELDS = (
+    'target', 'display_id', 'address', 'pin', 'timeout', 'mode', 'tags')
+# Max hostnames resolved at once
+RESOLVE_CONCURRENCY = 100
+
+_win_com_port_regexp = re.compile(r'COM\d+', re.IGNORECASE)
+
+
+def _parse_int(x):
+    return int(x, 16) if x.startswith('0x') else int(x)
+
+
+def detect_mode(address):
+    """
+    Returns "serial" for serial port names/paths, "tcp" otherwise.
+    """
+    if ':' not in address and (
+        '/' in address or address.startswith('.')
+        or _win_com_port_regexp.match(address)
+    ):
+        return 'serial'
+    return 'tcp'
+
+
+def parse_target(value):
+    """
+    Returns (address, display_id) of "DISPLAY_ID@ADDRESS[:PORT]" target.
+    """
+    if '@' not in value:
+        raise ValueError('DISPLAY_ID required (try 0, 1)')
+    display_id, address = value.split('@', 1)
+    try:
+        display_id = _parse_int(display_id)
+    except ValueError:
+        raise ValueError(
+            f'Invalid DISPLAY_ID "{display_id}" '
+            '(int or hex, example: 1, 0x01, 254, 0xFE)')
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        try:
+            address = f'{host}:{int(port)}'
+        except ValueError:
+            raise ValueError(f'Invalid PORT "{port}"')
+    return address, display_id
+
+
+def get_endpoint(mode, address):
+    """
+    Returns address with default port for "tcp" mode ("HOST:PORT"),
+    so targets behind same endpoint are matched.
+    """
+    if mode == 'tcp' and ':' not in address:
+        return f'{address}:1515'
+    return address
+
+
+def create_target(target=None, display_id=None, address=None, pin=None,
+                  timeout=None, mode=None, tags=None):
+    """
+    Returns Target from "target" (DISPLAY_ID@ADDRESS[:PORT])
+    or "display_id" and "address" values (like CSV/JSONL row),
+    tags may be list or string separated by ";" or spaces.
+    """
+    if target:
+        address, display_id = parse_target(str(target))
+    elif address and display_id not in (None, ''):
+        address, display_id = parse_target(f'{display_id}@{address}')
+    else:
+        raise ValueError('"target" or "display_id" and "address" required')
+    if mode in (None, ''):
+        mode = None
+    elif mode not in MODES:
+        raise ValueError(f'Invalid mode "{mode}" (tcp or serial)')
+    try:
+        pin = None if pin in (None, '') else int(pin)
+    except ValueError:
+        raise ValueError(f'Invalid pin "{pin}"')
+    try:
+        timeout = None if timeout in (None, '') else float(timeout)
+    except ValueError:
+        raise ValueError(f'Invalid timeout "{timeout}"')
+    if isinstance(tags, str):
+        tags = re.split(r'[;\s]+', tags.strip())
+    return Target(mode, address, display_id, pin, timeout,
+                  frozenset(tag for tag in tags or () if tag))
+
+
+def iter_targets(lines, name='<targets>'):
+    """
+    Yields Target for lines of targets file (may be file object,
+    so targets are streamed). Format is detected by first line:
+    JSON object per line (JSONL), CSV with header or
+    "DISPLAY_ID@ADDRESS[:PORT]" per line. Empty lines and lines
+    starting with "#" are skipped, same targets are yielded once.
+
+    CSV columns and JSON keys: "target" (or "display_id" and "address"),
+    optional "pin", "timeout", "mode" and "tags".
+    """
+    seen = set()
+    header = None
+    parse = None
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        if parse is None:
+            if line.startswith('{'):
+                parse = _parse_jsonl
+            elif ',' in line:
+                header = [column.strip() for column in next(csv.reader(
+                    [line]))]
+                parse = _parse_csv
+                continue
+            else:
+                parse = _parse_plain
+
+        try:
+            target = parse(line, header)
+        except ValueError as exc:
+            raise ValueError(f'{name}:{lineno}: "{line}": {exc}')
+
+        key = (target.mode, target_key(target.address), target.display_id)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield target
+
+
+def _parse_plain(line, header):
+    address, display_id = parse_target(line)
+    return Target(None, address, display_id, None, None, frozenset())
+
+
+def _parse_csv(line, header):
+    row = next(csv.reader([line]))
+    if len(row) > len(header):
+        raise ValueError(f'Expected {len(header)} columns')
+    return create_target(**_get_fields(dict(zip(header, row))))
+
+
+def _parse_jsonl(line, header):
+    try:
+        row = json.loads(line)
+    except ValueError as exc:
+        raise ValueError(f'Invalid JSON: {exc}')
+    if not isinstance(row, dict):
+        raise ValueError('JSON object expected')
+    return create_target(**_get_fields(row))
+
+
+def _get_fields(row):
+    return {key: value for key, value in row.items() if key in FIELDS}
+
+
+def load_targets(path):
+    """
+    Yields Target from targets file (see iter_targets).
+    """
+    with open(path) as fh:
+        yield from iter_targets(fh, path)
+
+
+def is_ip(host):
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+class DNSCache:
+    """
+    Resolved addresses by hostname shared by connections
+    (see MDCConnection.dns_cache), so hostnames of large fleet
+    are resolved once and concurrently before connecting
+    instead of on every connect.
+    """
+    def __init__(self):
+        self._addresses = {}
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def get(self, host):
+        """
+        Returns resolved address of host (or host itself).
+        """
+        return self._addresses.get(host, host)
+
+    async def resolve(self, host):
+        if is_ip(host) or host in self._addresses:
+            return
+        loop = asyncio.get_event_loop()
+        try:
+            infos = await loop.getaddrinfo(
+                host, None, type=socket.SOCK_STREAM)
+        except OSError:
+            # Not cached, so connect fails with resolution error
+            return
+        self._addresses[host] = infos[0][4][0]
+
+    async def resolve_all(self, hosts, concurrency=RESOLVE_CONCURRENCY):
+        await fan_out(self.resolve, [(host,) for host in set(hosts)],
+                      concurrency)
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+import json
+import os
+import ssl
+
+
+# asyncio loop.start_tls doesn't accept session to resume,
+# so it's passed to SSLContext.wrap_bio using context variable
+_resume_session: ContextVar = ContextVar('_resume_session', default=None)
+
+
+class _SSLContext(ssl.SSLContext):
+    def wrap_bio(self, incoming, outgoing, server_side=False,
+                 server_hostname=None, session=None):
+        return super().wrap_bio(
+            incoming, outgoing, server_side=server_side,
+            server_hostname=server_hostname,
+            session=session or _resume_session.get())
+
+
+_ssl_context = None
+
+
+def target_key(target):
+    """
+    Returns hashable target representation ("HOST:PORT" for tuple target)
+    """
+    if isinstance(target, (list, tuple)):
+        return ':'.join(map(str, target))
+    return target
+
+
+def get_ssl_context():
+    """
+    Returns SSL context shared by all connections in process
+    (required for session resumption and avoids per-connect setup cost).
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        ctx = _SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        ctx.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.VerifyMode.CERT_NONE
+        _ssl_context = ctx
+    return _ssl_context
+
+
+class TLSSessionCache:
+    """
+    TLS sessions by target, so reconnect to same target
+    may resume session instead of full handshake.
+    """
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._sessions = OrderedDict()
+        self.handshakes = 0
+        self.resumed = 0
+
+    def get(self, target):
+        target = target_key(target)
+        session = self._sessions.get(target)
+        if session is not None:
+            self._sessions.move_to_end(target)
+        return session
+
+    def update(self, target, ssl_object):
+        # Called on established connection to record handshake stats
+        # and store session (which may be replaced by server)
+        target = target_key(target)
+        self.handshakes += 1
+        if ssl_object.session_reused:
+            self.resumed += 1
+        if ssl_object.session is not None:
+            self._sessions[target] = ssl_object.session
+            self._sessions.move_to_end(target)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+
+    def discard(self, target):
+        self._sessions.pop(target_key(target), None)
+
+    def __repr__(self):
+        return (f'<TLSSessionCache sessions={len(self._sessions)} '
+                f'handshakes={self.handshakes} resumed={self.resumed}>')
+
+
+class TLSTargetCache:
+    """
+    Remembers whether target requires TLS ("Secured Protocol"),
+    so "auto" TLS mode connections may skip detection.
+    Persisted to JSON file if path provided.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self._targets = {}
+        if path and os.path.exists(path):
+            with open(path) as fh:
+                self._targets = json.load(fh)
+
+    def get(self, target):
+        return self._targets.get(target_key(target))
+
+    def set(self, target, tls):
+        self._targets[target_key(target)] = bool(tls)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(self._targets, fh, indent=0, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -1,5 +1,5 @@
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, time
 
 
 def _bit_unmask(val, length=None):
@@ -9,10 +9,7 @@ def _bit_unmask(val, length=None):
     return rv
 
 
-def parse_enum_bitmask(enum, value):
-    """
-    Returns tuple of enum values, which was set to 1 in bitmask
-    """
+def _parse_enum_bitmask(enum, value):
     return tuple(
         enum(i)
         for i, x in enumerate(
@@ -21,6 +18,33 @@ def parse_enum_bitmask(enum, value):
     )
 
 
+# {enum: parse_enum_bitmask result (or ValueError args) for each byte}
+_BITMASK_TABLES = {}
+
+
+def _get_bitmask_table(enum):
+    table = []
+    for value in range(256):
+        try:
+            table.append(_parse_enum_bitmask(enum, value))
+        except ValueError as exc:
+            table.append(exc)
+    _BITMASK_TABLES[enum] = table
+    return table
+
+
+def parse_enum_bitmask(enum, value):
+    """
+    Returns tuple of enum values, which was set to 1 in bitmask
+    """
+    if not 0 <= value < 256:
+        return _parse_enum_bitmask(enum, value)
+    rv = (_BITMASK_TABLES.get(enum) or _get_bitmask_table(enum))[value]
+    if isinstance(rv, ValueError):
+        raise ValueError(*rv.args)
+    return rv
+
+
 def pack_bitmask(values):
     rv = 0
     for val in values:
@@ -35,14 +59,19 @@ def parse_mdc_time(day_part, hour, minute, second=0):
     PM = 0x00
     AM = 0x01
     """
-    return datetime.strptime(
-        f'{day_part and "AM" or "PM"} {hour} {minute} {second}',
-        '%p %I %M %S').time()
+    if not (1 <= hour <= 12 and 0 <= minute < 60 and 0 <= second < 60):
+        raise ValueError(
+            f'Invalid time: {hour}:{minute}:{second} '
+            f'{day_part and "AM" or "PM"}')
+    return time(hour % 12 + (0 if day_part else 12), minute, second)
 
 
 def pack_mdc_time(time):
-    time = time.strftime('%p %I %M %S').split()
-    return int(time[0] == 'AM'), int(time[1]), int(time[2]), int(time[3])
+    """
+    Returns (day_part, hour, minute, second) in 12-hour format
+    """
+    return (int(time.hour < 12), time.hour % 12 or 12,
+            time.minute, time.second)
 
 
 def repr_hex(value):
@@ -54,11 +83,15 @@ def parse_hex(value):
     return value and bytes(int(x, 16) for x in value.split(':')) or b''
 
 
+# (x, y) for each coordinates byte
+_VIDEOWALL_MODELS = [(value & 0x0F, value >> 4) for value in range(256)]
+
+
 def parse_videowall_model(value):
     """
     Splits coordinates byte (with y, x representation) to (x, y) tuple
     """
-    return divmod(value, 1 << 4)[::-1]
+    return _VIDEOWALL_MODELS[value]
 
 
 def pack_videowall_model(value):
@@ -66,3 +99,19 @@ def pack_videowall_model(value):
     Converts (x, y) tuple to one coordinates byte (with y, x representation)
     """
     return [(value[1] * 16) + value[0]]
+
+
+def to_jsonable(value):
+    """
+    Converts command response values to JSON compatible types
+    (enums to names, date/time to isoformat, tuples to lists)
+    """
+    if isinstance(value, dict):
+        return {key: to_jsonable(x) for key, x in value.items()}
+    if isinstance(value, (tuple, list)):
+        return [to_jsonable(x) for x in value]
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (datetime, time)):
+        return value.isoformat()
+    return value
@@ -0,0 +1,52 @@
+from . import MDC
+from .reconcile import Setting, plan, apply, read_state
+
+
+# Video wall model coordinates are packed to one byte nibbles
+MAX_SIZE = 15
+
+
+def get_settings(columns, rows, serial, mode=None):
+    """
+    Returns list of reconcile.Setting for video wall panel
+    with SERIAL position (counting from 1, left to right, top to bottom).
+    Video wall mode is left untouched if not set.
+    """
+    if not (0 < columns <= MAX_SIZE and 0 < rows <= MAX_SIZE):
+        raise ValueError(f'Video wall size should be up to '
+                         f'{MAX_SIZE}x{MAX_SIZE}')
+    if not 0 < serial <= columns * rows:
+        raise ValueError(f'Serial {serial} is out of {columns}x{rows} wall')
+
+    state, model = (
+        MDC._commands['video_wall_state'], MDC._commands['video_wall_model'])
+    settings = [
+        Setting(state, (), (state.VIDEO_WALL_STATE.ON,)),
+        Setting(model, (), ((columns, rows), serial)),
+    ]
+    if mode is not None:
+        mode_command = MDC._commands['video_wall_mode']
+        settings.append(Setting(mode_command, (), (
+            mode_command.VIDEO_WALL_MODE[mode.upper()]
+            if isinstance(mode, str) else mode,)))
+    return settings
+
+
+async def setup_panel(mdc, display_id, settings):
+    """
+    Applies changed video wall settings (video wall state first)
+    and reads them back.
+    Returns (applied changes, settings not matching after apply).
+    """
+    changes = await plan(mdc, display_id, settings)
+    await apply(mdc, display_id, changes)
+
+    state = await read_state(mdc, display_id, settings)
+    failed = [
+        setting for setting in settings
+        if (setting.command.name, setting.args) not in state
+        or setting.command.pack_payload_data(
+            state[setting.command.name, setting.args])
+        != setting.command.pack_payload_data(setting.data)
+    ]
+    return changes, failed
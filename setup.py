@@ -9,6 +9,12 @@ requires = [
 serial_requires = [
     'pyserial-asyncio'  # tested: pyserial==3.5; pyserial-asyncio==0.5
 ]
+yaml_requires = [
+    'pyyaml',  # for "apply" command state files
+]
+bulk_requires = [
+    'numpy',  # for samsung_mdc.bulk decoding
+]
 # TODO: leaving serial in default dependencies
 # just not to make README and pipx usage too complicated
 requires += serial_requires
@@ -51,7 +57,9 @@ setup(
     extras_require={
         'test': test_requires,
         'serial': serial_requires,
-        'all': serial_requires,
+        'yaml': yaml_requires,
+        'bulk': bulk_requires,
+        'all': serial_requires + yaml_requires + bulk_requires,
     },
     entry_points={
         'console_scripts': [
@@ -1,4 +1,7 @@
 from typing import AsyncIterator
+from pathlib import Path
+import asyncio
+import ssl
 import sys
 from unittest.mock import Mock
 from asyncio import StreamReader, StreamWriter
@@ -53,7 +56,8 @@ class MDCMockSingleton(MDCMock):
         # when overriding __new__ - __init__ applied anyway,
         # so we shouldn't recreate writer/reader for
         # MDCMockSingleton purposes
-        writer, reader = self._singleton.writer, self._singleton.reader
+        writer = getattr(self._singleton, 'writer', None)
+        reader = getattr(self._singleton, 'reader', None)
         super().__init__(*args, **kwargs)
         self.writer = writer or self.writer
         self.reader = reader or self.reader
@@ -74,3 +78,48 @@ async def mdc_mock() -> AsyncIterator[MDCMockSingleton]:
         samsung_mdc.MDC = MDC  # type: ignore[misc]
         samsung_mdc.cli.MDC = MDC  # type: ignore[misc]
         MDCMockSingleton._singleton = None
+
+
+@pytest_asyncio.fixture
+async def mdc_server():
+    """
+    Starts local display server answering any request with ACK [1],
+    "Secured Protocol" one (with any PIN) if tls=True.
+    Returns port.
+    """
+    servers = []
+    # Shared, so sessions may be resumed
+    ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ssl_context.load_cert_chain(Path(__file__).parent / 'keycert.pem')
+
+    async def serve(reader, writer):
+        while True:
+            request = await reader.read(5)
+            if not request:
+                break
+            writer.write(pack_response(request[1], request[2], True, [1]))
+        writer.close()
+
+    async def serve_tls(reader, writer):
+        writer.write(b'MDCSTART<<TLS>>')
+        await writer.drain()
+        # Like MDCConnection._start_tls (StreamWriter.start_tls is 3.11+)
+        transport = await asyncio.get_event_loop().start_tls(
+            writer.transport, writer.transport.get_protocol(), ssl_context,
+            server_side=True)
+        writer._transport = reader._transport = transport
+        await reader.read(4)
+        writer.write(b'MDCAUTH<<PASS>>')
+        await serve(reader, writer)
+
+    async def start(tls=False):
+        server = await asyncio.start_server(
+            serve_tls if tls else serve, '127.0.0.1', 0)
+        servers.append(server)
+        return server.sockets[0].getsockname()[1]
+
+    try:
+        yield start
+    finally:
+        for server in servers:
+            server.close()
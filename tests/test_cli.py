@@ -1,10 +1,15 @@
+import asyncio
+import json
 import re
 
+import click
 import pytest
 import nest_asyncio2  # type: ignore[import-not-found]
 from click.testing import CliRunner
-from samsung_mdc.cli import cli
+from samsung_mdc.cli import cli, _create_targets
 from samsung_mdc import MDC
+from samsung_mdc.connection import pack_response
+from samsung_mdc.targets import Target, create_target, iter_targets
 
 
 def run(*args):
@@ -39,6 +44,12 @@ def test_help():
         ['ssid', 'passwd'], bytes([0, 4]) + b'ssid' + bytes([1, 6]) + b'passwd',
         ['ssid', 'passwd'], bytes([0, 4]) + b'ssid' + bytes([1, 6]) + b'passwd',
     ],
+    [
+        # Zero SUBCMD is not sent in response
+        'clear_menu', 0,
+        [], [],
+        [], [],
+    ],
 ])
 @pytest.mark.asyncio
 async def test_command(
@@ -51,3 +62,265 @@ async def test_command(
     mdc_mock.assert_request(command, display_id, req_data)
     assert rv.exit_code == 0, rv.output
     assert rv.output == f'{target} {" ".join(map(str, resp))}\n'
+
+
+def test_discover_without_target():
+    rv = run('-t', '3', 'discover', '10.0.0.0/33')
+    assert rv.exit_code == 2, rv.output
+    assert 'Invalid value for NETWORK' in rv.output
+
+
+@pytest.mark.asyncio
+async def test_inventory(mdc_mock, tmp_path):
+    db = str(tmp_path / 'inventory.db')
+    target = '0@127.0.0.1'
+    for name, data in [
+        ('serial_number', b'SN1'),
+        ('model_name', b'QM55R'),
+        ('model_number', [2, 1, 0]),
+        ('software_version', b'T-1'),
+        ('network_configuration', [10, 0, 0, 2] + [255, 255, 255, 0]
+         + [10, 0, 0, 1] + [8, 8, 8, 8]),
+    ]:
+        mdc_mock.feed_response(MDC._commands[name], 0, data)
+
+    expected = (
+        f'{target} serial_number=SN1 model_name=QM55R '
+        'model_number=LCD,1,SUPPORTED software_version=T-1 '
+        'network_configuration=10.0.0.2,255.255.255.0,10.0.0.1,8.8.8.8\n')
+    rv = run(target, 'inventory', '--db', db)
+    assert rv.exit_code == 0, rv.output
+    assert rv.output == expected
+
+    # Nothing is requested, since facts are fresh
+    mdc_mock.writer.write.reset_mock()
+    rv = run(target, 'inventory', '--db', db)
+    assert rv.exit_code == 0, rv.output
+    assert rv.output == expected
+    assert not mdc_mock.writer.write.called
+
+
+@pytest.mark.asyncio
+async def test_apply(mdc_mock, tmp_path):
+    state_file = tmp_path / 'state.json'
+    state_file.write_text(json.dumps({
+        'settings': {'power': True, 'volume': 10, 'mute': 'off'},
+        'groups': [{'targets': ['0@*'], 'settings': {'volume': 15}}],
+    }))
+    target = '0@127.0.0.1'
+    status = MDC._commands['status']
+    # power OFF, volume 5, mute OFF
+    mdc_mock.feed_response(status, 0, [0, 5, 0, 0x21, 0x10, 0, 0])
+    mdc_mock.feed_response(MDC._commands['power'], 0, [1])
+    mdc_mock.feed_response(MDC._commands['volume'], 0, [15])
+
+    rv = run(target, 'apply', str(state_file))
+    assert rv.exit_code == 0, rv.output
+    assert rv.output == (
+        f'{target} power <POWER_STATE.OFF:0> -> <POWER_STATE.ON:1>\n'
+        f'{target} volume 5 -> 15\n'
+        f'{target} Applied: 2\n'
+    )
+    mdc_mock.assert_request(MDC._commands['volume'], 0, [15])
+
+    for state in [['volume'], {'groups': [{'targets': ['0@*']}, 'volume']},
+                  {'groups': [{'settings': {'volume': 15}}]},
+                  {'settings': ['volume']}]:
+        state_file.write_text(json.dumps(state))
+        rv = run(target, 'apply', '--dry-run', str(state_file))
+        assert rv.exit_code == 2, rv.output
+        assert 'expected' in rv.output
+
+
+@pytest.mark.asyncio
+async def test_schedule_sync(mdc_mock, tmp_path):
+    schedule_file = tmp_path / 'schedule.json'
+    schedule_file.write_text(json.dumps({
+        'timer_15': {
+            1: ['08:00', 'on', '20:00', 'on', 'everyday', [],
+                'everyday', [], 10, 'hdmi1', 0],
+            2: ['07:00', 'on', '21:00', 'on', 'everyday', [],
+                'everyday', [], 10, 'hdmi1', 0],
+        },
+        'holidays': [[1, 1, 1, 2]],
+    }))
+    target = '0@127.0.0.1'
+    timer_15 = MDC._commands['timer_15']
+    timer = [8, 0, 1, 1, 8, 0, 0, 1, 1, 0, 1, 0, 10, 0x21, 0]
+    for cmd in timer_15._TIMER_ID_CMD:
+        mdc_mock.reader.feed_data(pack_response(cmd, 0, True, timer))
+    holiday_get = MDC._commands['holiday_get']
+    mdc_mock.feed_response(holiday_get, 0, [1, 0, 0, 0, 0])
+    mdc_mock.feed_response(holiday_get, 0, [1, 12, 24, 12, 26])
+    mdc_mock.reader.feed_data(pack_response(0xA5, 0, True, []))
+    holiday_set = MDC._commands['holiday_set']
+    mdc_mock.feed_response(holiday_set, 0, [])
+    mdc_mock.feed_response(holiday_set, 0, [])
+
+    rv = run(target, 'schedule-sync', str(schedule_file))
+    assert rv.exit_code == 0, rv.output
+    assert rv.output.splitlines()[1:] == [
+        f'{target} holiday_set ? -> <HOLIDAY_MANAGE.DELETE:1> 12 24 12 26',
+        f'{target} holiday_set ? -> <HOLIDAY_MANAGE.ADD:0> 1 1 1 2',
+        f'{target} Written: 3',
+    ]
+    assert rv.output.startswith(f'{target} timer_15 2 ')
+    # All changes are written with one batch
+    assert mdc_mock.writer.write.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_videowall(mdc_mock):
+    target = '0@127.0.0.1'
+    state = MDC._commands['video_wall_state']
+    model = MDC._commands['video_wall_model']
+    # current state
+    mdc_mock.feed_response(state, 0, [0])
+    mdc_mock.feed_response(model, 0, [0xff], ack=False)
+    # apply
+    mdc_mock.feed_response(state, 0, [1])
+    mdc_mock.feed_response(model, 0, [0x11, 1])
+    # verification
+    mdc_mock.feed_response(state, 0, [1])
+    mdc_mock.feed_response(model, 0, [0x11, 1])
+
+    rv = run(target, 'videowall', '1x1')
+    assert rv.exit_code == 0, rv.output
+    assert rv.output == f'{target} serial=1 Applied: 2\n'
+
+    rv = run(target, 'videowall', '2x2')
+    assert rv.exit_code == 2
+    assert '2x2 wall requires 4 targets, got 1' in rv.output
+
+
+@pytest.mark.asyncio
+async def test_rollout(mdc_mock, tmp_path):
+    targets_file = tmp_path / 'targets.txt'
+    targets_file.write_text('\n'.join(f'{i}@127.0.0.1' for i in range(4)))
+    volume = MDC._commands['volume']
+    # canary, then wave of 2 with failed verification on display 1
+    for display_id, current in [(0, 20), (1, 10), (2, 20)]:
+        mdc_mock.feed_response(volume, display_id, [20])
+        mdc_mock.feed_response(volume, display_id, [current])
+
+    rv = run(str(targets_file), 'rollout', '-c', '1', 'volume', '20')
+    assert rv.exit_code == 1, rv.output
+    assert rv.output == (
+        '0@127.0.0.1 20\n'
+        'Wave 1: 1 targets, 0 failed, 0 NAK\n'
+        '1@127.0.0.1 MDCVerificationError: Verification failed: '
+        '(10,) != (20,)\n'
+        '2@127.0.0.1 20\n'
+        'Wave 2: 2 targets, 1 failed, 0 NAK\n'
+        'Rollout aborted, targets left untouched: 1\n'
+    )
+
+
+def test_preconnect(tmp_path):
+    # Nothing is listening on port 1, so connection is refused
+    targets = tmp_path / 'targets.txt'
+    targets.write_text('1@127.0.0.1:1\n2@127.0.0.1:1\n')
+    result = run('--preconnect', '-t', '1', str(targets), 'power')
+    assert result.exit_code == 1, result.output
+    assert result.output.count('Unreachable: ') == 2
+    assert 'Unreachable targets: 2' in result.output
+    assert 'Failed targets' not in result.output
+
+    # Commands running targets without asyncio_run
+    result = run('--preconnect', '-t', '1', str(targets),
+                 'rollout', 'volume', '20')
+    assert result.exit_code == 1, result.output
+    assert 'Unreachable targets: 2' in result.output
+    assert 'Wave' not in result.output
+
+    result = run('--preconnect', '--processes', '2', str(targets), 'power')
+    assert result.exit_code == 2, result.output
+    assert 'not supported with --processes' in result.output
+
+
+@pytest.mark.asyncio
+async def test_targets_file(mdc_mock, tmp_path):
+    targets_file = tmp_path / 'targets.csv'
+    targets_file.write_text(
+        'target,pin,tags\n'
+        '0@127.0.0.1,,lobby;floor1\n'
+        '1@127.0.0.1,1234,floor1\n'
+        '0@127.0.0.1,,lobby\n')
+    power = MDC._commands['power']
+    mdc_mock.feed_response(power, 0, [1])
+    rv = run('--tag', 'lobby', str(targets_file), 'power')
+    assert rv.exit_code == 0, rv.output
+    assert rv.output == '0@127.0.0.1 <POWER_STATE.ON:1>\n'
+
+    assert list(iter_targets([
+        '# comment',
+        '{"display_id": 1, "address": "host:1516", "timeout": 3}',
+        '{"target": "2@/dev/ttyUSB0", "mode": "serial", "tags": ["a"]}',
+    ])) == [
+        Target(None, 'host:1516', 1, None, 3.0, frozenset()),
+        Target('serial', '/dev/ttyUSB0', 2, None, None, frozenset(['a'])),
+    ]
+    with pytest.raises(ValueError, match='<targets>:2: .* Invalid mode'):
+        list(iter_targets(['target,mode', '1@host,udp']))
+
+
+@pytest.mark.asyncio
+async def test_shared_endpoint(tmp_path):
+    connections = []
+
+    async def serve(reader, writer):
+        connections.append(writer)
+        while True:
+            request = await reader.read(5)
+            if not request:
+                return
+            await asyncio.sleep(0.01)
+            writer.write(pack_response(request[1], request[2], True, [1]))
+
+    server = await asyncio.start_server(serve, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    targets_file = tmp_path / 'targets.txt'
+    targets_file.write_text(
+        '\n'.join(f'{i}@127.0.0.1:{port}' for i in range(1, 4)))
+
+    rv = run(str(targets_file), 'power')
+    assert rv.exit_code == 0, rv.output
+    assert sorted(rv.output.splitlines()) == [
+        f'{i}@127.0.0.1:{port} <POWER_STATE.ON:1>' for i in range(1, 4)]
+    assert len(connections) == 1
+    server.close()
+    await server.wait_closed()
+
+    # Default port is same endpoint
+    targets = _create_targets(click.Context(cli), [
+        create_target(target) for target in (
+            '1@10.0.0.5', '2@10.0.0.5:1515', '3@10.0.0.5:1516')
+    ], 'auto', None, {}, set())
+    assert [connection.target for connection, _ in targets] == [
+        '10.0.0.5', '10.0.0.5', '10.0.0.5:1516']
+
+
+@pytest.mark.asyncio
+async def test_tls_auto(mdc_server, tmp_path):
+    plain = f'127.0.0.1:{await mdc_server()}'
+    secured = f'127.0.0.1:{await mdc_server(tls=True)}'
+    targets_file = tmp_path / 'targets.txt'
+    targets_file.write_text(f'0@{plain}\n0@{secured}\n')
+    tls_cache = tmp_path / 'tls.json'
+
+    for _ in range(2):
+        rv = run('--tls-auto', '--pin', '1234', '--tls-cache',
+                 str(tls_cache), str(targets_file), 'power')
+        assert rv.exit_code == 0, rv.output
+        assert sorted(rv.output.splitlines()) == sorted(
+            f'0@{target} <POWER_STATE.ON:1>' for target in (plain, secured))
+        assert json.loads(tls_cache.read_text()) == {
+            plain: False, secured: True}
+
+
+def test_processes_not_supported(tmp_path):
+    script_file = tmp_path / 'script.txt'
+    script_file.write_text('power\n')
+    rv = run('--processes', '2', '0@127.0.0.1', 'script', str(script_file))
+    assert rv.exit_code == 2, rv.output
+    assert '--processes is not supported by script' in rv.output
@@ -1,6 +1,18 @@
+from datetime import datetime, time
+import asyncio
+import json
+
 import pytest
 
-from samsung_mdc import MDC, commands
+from samsung_mdc import MDC, clock, commands
+from samsung_mdc.capabilities import CapabilityCache
+from samsung_mdc.connection import pack_payload, pack_response
+from samsung_mdc.exceptions import NAKError, MDCUnsupportedCommand
+from samsung_mdc.remote import KeyPacer, parse_keys, send_keys
+from samsung_mdc.results import ResultBatch
+from samsung_mdc.utils import (
+    parse_mdc_time, pack_mdc_time, parse_enum_bitmask, pack_bitmask,
+    parse_videowall_model, pack_videowall_model)
 
 
 _SET_CONTENT_DOWNLOAD_URLS = [
@@ -53,3 +65,185 @@ async def test_command(
     result = await getattr(mdc_mock, command.name)(display_id, data=req)
     mdc_mock.assert_request(command, display_id, req_data)
     assert result == tuple(resp)
+
+
+@pytest.mark.asyncio
+async def test_get_coalescing(mdc_mock):
+    command = MDC._commands['serial_number']
+    mdc_mock.feed_response(command, 0, b'SERIAL')
+    results = await asyncio.gather(*(
+        mdc_mock.serial_number(0) for _ in range(3)))
+    assert mdc_mock.writer.write.call_count == 1
+    assert results == [('SERIAL',)] * 3
+    assert not mdc_mock._inflight
+
+
+@pytest.mark.asyncio
+async def test_capabilities(mdc_mock):
+    mdc_mock.capabilities = CapabilityCache()
+    mdc_mock.feed_response(MDC.model_name, 0, b'QM55R')
+    mdc_mock.feed_response(MDC.software_version, 0, b'T-1')
+    mdc_mock.feed_response(MDC.clock_s, 0, [1], ack=False)
+    with pytest.raises(NAKError):
+        await mdc_mock.clock_s(0)
+
+    mdc_mock.writer.write.reset_mock()
+    with pytest.raises(MDCUnsupportedCommand):
+        await mdc_mock.clock_s(0)
+    assert not mdc_mock.writer.write.called
+    assert await mdc_mock.resolve_command(0, 'clock_s', 'clock_m') \
+        is MDC.clock_m
+
+    # NAK on SET (like value not accepted in current state)
+    # is not remembered
+    mdc_mock.feed_response(MDC.volume, 0, [1], ack=False)
+    with pytest.raises(NAKError):
+        await mdc_mock.volume(0, [100])
+    assert mdc_mock.capabilities.is_supported('QM55R/T-1', 'volume') is None
+
+
+@pytest.mark.asyncio
+async def test_sync_clock_minutes(mdc_mock, monkeypatch):
+    now = [datetime(2024, 5, 1, 10, 30, 20, 500000).timestamp()]
+
+    async def sleep(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr(clock, 'time', lambda: now[0])
+    monkeypatch.setattr(clock.asyncio, 'sleep', sleep)
+
+    clock_m = MDC._commands['clock_m']
+    display = clock_m.DATA[0].pack(datetime(2024, 5, 1, 10, 30))
+    mdc_mock.feed_response(MDC.clock_s, 0, [1], ack=False)
+    for _ in range(3):
+        mdc_mock.feed_response(clock_m, 0, display)
+
+    rv = await clock.sync_clock(mdc_mock, 0, samples=1)
+    assert rv.command is clock_m
+    # Set on minute boundary, not on next second
+    assert datetime.fromtimestamp(now[0]) == datetime(2024, 5, 1, 10, 31)
+    mdc_mock.writer.write.assert_any_call(pack_payload(
+        clock_m.CMD, 0, clock_m.DATA[0].pack(datetime(2024, 5, 1, 10, 31))))
+
+
+@pytest.mark.asyncio
+async def test_send_keys(mdc_mock):
+    virtual_remote = MDC._commands['virtual_remote']
+    keys = parse_keys(['menu', 'down*2', '0x68'])
+    assert keys == [virtual_remote.KEY_CODE.KEY_MENU] + [
+        virtual_remote.KEY_CODE.KEY_CURSOR_DOWN] * 2 + [
+        virtual_remote.KEY_CODE.KEY_ENTER]
+    for key in keys:
+        mdc_mock.feed_response(virtual_remote, 0, [key])
+    pacer = KeyPacer(min_gap=0)
+    await send_keys(mdc_mock, 0, keys, pacer)
+    mdc_mock.assert_request(virtual_remote, 0, [0x68])
+    # Fast ACK responses are learned
+    assert pacer.get_gap(('mock', 0)) < 0.05
+    # but gap is not shorter than default min gap
+    pacer = KeyPacer()
+    pacer.update(('mock', 0), 0.01)
+    assert pacer.get_gap(('mock', 0)) == 0.3
+
+    # NAKed key is resent once after doubled gap
+    pacer = KeyPacer(min_gap=0.01)
+    mdc_mock.feed_response(virtual_remote, 0, [0x01], ack=False)
+    mdc_mock.feed_response(virtual_remote, 0, [keys[0]])
+    await send_keys(mdc_mock, 0, keys[:1], pacer)
+    assert mdc_mock.writer.write.call_count == len(keys) + 2
+    assert pacer.get_gap(('mock', 0)) == 0.02
+    mdc_mock.feed_response(virtual_remote, 0, [0x01], ack=False)
+    mdc_mock.feed_response(virtual_remote, 0, [0x01], ack=False)
+    with pytest.raises(NAKError):
+        await send_keys(mdc_mock, 0, keys[:1], pacer)
+    assert pacer.get_gap(('mock', 0)) == 0.08
+
+
+def test_bulk_decode():
+    pytest.importorskip('numpy')
+    from samsung_mdc.bulk import decode
+
+    status = MDC._commands['status']
+    frame = pack_response(status.CMD, 1, True, [1, 5, 0, 0x21, 0x10, 0, 0])
+    nak = pack_response(status.CMD, 2, False, [1])
+    broken = frame[:-1] + bytes([(frame[-1] + 1) % 256])
+    rv = decode(frame + nak + broken + frame, status)
+    assert rv.display_id.tolist() == [1, 2, 1, 1]
+    assert rv.valid.tolist() == [True, False, False, True]
+    assert rv.columns['VOLUME'][rv.valid].tolist() == [5, 5]
+    assert rv.columns['INPUT_SOURCE_STATE'][0] == 0x21
+
+    # Per frame fallback for variable length fields
+    serial_number = MDC._commands['serial_number']
+    rv = decode(pack_response(serial_number.CMD, 0, True, b'SN1') + nak,
+                serial_number)
+    assert rv.valid.tolist() == [True, False]
+    assert rv.columns['SERIAL_NUMBER'].tolist() == ['SN1', None]
+
+
+def _parse_mdc_time_reference(day_part, hour, minute, second=0):
+    # Previous strptime implementation
+    return datetime.strptime(
+        f'{day_part and "AM" or "PM"} {hour} {minute} {second}',
+        '%p %I %M %S').time()
+
+
+def test_time_codec():
+    for day_part in (0, 1):
+        for hour in range(16):
+            for minute in range(0, 100, 7):
+                for second in (0, 59, 60):
+                    try:
+                        expected = _parse_mdc_time_reference(
+                            day_part, hour, minute, second)
+                    except ValueError:
+                        with pytest.raises(ValueError):
+                            parse_mdc_time(day_part, hour, minute, second)
+                        continue
+                    assert parse_mdc_time(
+                        day_part, hour, minute, second) == expected
+
+    for hour in range(24):
+        value = time(hour, 30, 15)
+        day_part, hour, minute, second = value.strftime(
+            '%p %I %M %S').split()
+        assert pack_mdc_time(value) == (
+            int(day_part == 'AM'), int(hour), int(minute), int(second))
+
+
+def test_bitmask_codec():
+    weekday = commands.TIMER_15.WEEKDAY
+    for value in range(256):
+        try:
+            expected = tuple(
+                weekday(i) for i in range(8) if value & (1 << i))
+        except ValueError:
+            with pytest.raises(ValueError):
+                parse_enum_bitmask(weekday, value)
+            continue
+        assert parse_enum_bitmask(weekday, value) == expected
+        assert pack_bitmask(expected) == value
+
+    for value in range(256):
+        assert parse_videowall_model(value) == divmod(value, 16)[::-1]
+        assert pack_videowall_model(parse_videowall_model(value)) == [value]
+
+
+def test_result_records():
+    status = MDC._commands['status']
+    rv = status.parse_response_data(bytes([1, 5, 0, 0x21, 0x10, 0, 0]))
+    assert rv[:3] == (commands.POWER.POWER_STATE.ON, 5,
+                      commands.MUTE.MUTE_STATE.OFF)
+    assert rv.VOLUME == 5
+    assert rv.as_dict()['POWER_STATE'] == commands.POWER.POWER_STATE.ON
+    assert json.loads(rv.to_json())['INPUT_SOURCE_STATE'] == 'HDMI1'
+
+    timer_15 = MDC._commands['timer_15']
+    timer = timer_15.parse_response_data(
+        bytes([8, 0, 1, 1, 12, 30, 0, 1, 5, 0x41, 1, 0, 10, 0x21, 0]))
+    batch = ResultBatch(timer_15, [timer, timer])
+    assert len(batch) == 2
+    assert list(batch) == [timer, timer]
+    assert batch.column('VOLUME').tolist() == [10, 10]
+    assert batch.as_dict()['ON_MANUAL_WEEKDAY'] == [
+        (timer_15.WEEKDAY.SUN, timer_15.WEEKDAY.SAT)] * 2
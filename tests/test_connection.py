@@ -0,0 +1,315 @@
+import asyncio
+import socket
+import struct
+
+import pytest
+
+from samsung_mdc import MDC
+from samsung_mdc.discovery import Discovered, discover, probe
+from samsung_mdc.capture import CaptureWriter, ReplayMDC, read_capture, replay
+from samsung_mdc.connection import (
+    pack_payload, pack_response, SENT, RECEIVED, HEARTBEAT_CMD, _pack_cached)
+from samsung_mdc.exceptions import (
+    MDCResponseError, MDCTimeoutError, MDCTLSRequired)
+from samsung_mdc.tls import TLSSessionCache, TLSTargetCache, get_ssl_context
+from samsung_mdc.utils import repr_hex
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests(mdc_mock):
+    power, volume = MDC._commands['power'], MDC._commands['volume']
+    mdc_mock.feed_response(power, 0, [1])
+    mdc_mock.feed_response(volume, 0, [15])
+    assert await asyncio.gather(
+        mdc_mock.power(0), mdc_mock.volume(0)
+    ) == [(power.POWER_STATE.ON,), (15,)]
+
+
+def respond_on_write(mdc, *responses):
+    # Feeds responses (list per request) when request is written,
+    # like responses arriving after request
+    responses = list(responses)
+
+    def write(payload):
+        for command, display_id, data in responses.pop(0):
+            mdc.feed_response(command, display_id, data)
+    mdc.writer.write.side_effect = write
+
+
+@pytest.mark.asyncio
+async def test_stale_response_skipped(mdc_mock):
+    power, volume = MDC._commands['power'], MDC._commands['volume']
+    mdc_mock.timeout = 0.01
+    with pytest.raises(MDCTimeoutError):
+        await mdc_mock.power(0)
+
+    # Partial garbage is discarded before next request,
+    # late response to timed out request arrives after it
+    mdc_mock.reader.feed_data(b'\x01\x02')
+    respond_on_write(mdc_mock, [(power, 0, [1]), (volume, 0, [15])])
+    assert await mdc_mock.volume(0) == (15,)
+    assert not mdc_mock._desynced
+
+
+@pytest.mark.asyncio
+async def test_timeout_retry(mdc_mock):
+    power, volume = MDC._commands['power'], MDC._commands['volume']
+    mdc_mock.timeout = 0.01
+    with pytest.raises(MDCTimeoutError):
+        await mdc_mock.power(0)
+
+    # Late response to timed out request is discarded before retry
+    mdc_mock.feed_response(power, 0, [1])
+    respond_on_write(mdc_mock, [(power, 0, [0])], [(volume, 0, [15])])
+    assert await mdc_mock.power(0) == (power.POWER_STATE.OFF,)
+    assert await mdc_mock.volume(0) == (15,)
+
+    # Response of other command or display fails fast while in sync,
+    # but is skipped after desync
+    for command, display_id, error in [(power, 0, 'Unexpected response'),
+                                       (volume, 1, 'Unexpected display_id')]:
+        respond_on_write(mdc_mock, [(command, display_id, [1])])
+        with pytest.raises(MDCResponseError, match=error):
+            await mdc_mock.volume(0)
+        assert mdc_mock._desynced
+        mdc_mock._desynced = False
+    mdc_mock._desynced = True
+    respond_on_write(mdc_mock, [(power, 0, [1]), (volume, 1, [10]),
+                                (volume, 0, [20])])
+    assert await mdc_mock.volume(0) == (20,)
+
+
+@pytest.mark.asyncio
+async def test_resync(mdc_mock):
+    volume = MDC._commands['volume']
+    mdc_mock.resync = True
+    # Noise, frame with broken checksum and valid response
+    mdc_mock.reader.feed_data(b'\x00\xaa\xff\x00\x03\x41\x12\x0f\x00')
+    mdc_mock.feed_response(volume, 0, [15])
+    assert await mdc_mock.volume(0) == (15,)
+    assert mdc_mock.resync_skipped == 9
+
+
+@pytest.mark.asyncio
+async def test_send_batch(mdc_mock):
+    power, volume = MDC._commands['power'], MDC._commands['volume']
+    mdc_mock.feed_response(power, 0, [1])
+    mdc_mock.feed_response(volume, 0, [0xff], ack=False)
+    assert await mdc_mock.send_batch([
+        (power.CMD, 0, b''), (volume.CMD, 0, b''),
+    ]) == [(True, (power.CMD,), b'\x01'), (False, (volume.CMD,), b'\xff')]
+    mdc_mock.writer.write.assert_called_once_with(
+        pack_payload(power.CMD, 0, b'') + pack_payload(volume.CMD, 0, b''))
+
+
+@pytest.mark.asyncio
+async def test_capture_replay(mdc_mock, tmp_path):
+    power = MDC._commands['power']
+    with CaptureWriter(tmp_path / 'capture.bin') as capture:
+        mdc_mock.capture = capture
+        mdc_mock.feed_response(power, 0, [1])
+        await mdc_mock.power(0)
+    records = list(read_capture(tmp_path / 'capture.bin'))
+    assert [(r.direction, r.target, r.frame) for r in records] == [
+        (SENT, 'mock', pack_payload(power.CMD, 0)),
+        (RECEIVED, 'mock', pack_response(power.CMD, 0, True, [1])),
+    ]
+
+    responses = []
+    await replay(ReplayMDC('mock', records, speed=0), records,
+                 lambda *args: responses.append(args[:3]))
+    assert responses == [(0, 'power', (power.POWER_STATE.ON,))]
+
+
+@pytest.mark.asyncio
+async def test_capture_raw(mdc_mock, tmp_path):
+    volume = MDC._commands['volume']
+    noise = b'\x00\xaa\xff\x00\x03\x41\x12\x0f\x00'
+    with CaptureWriter(tmp_path / 'capture.bin') as capture:
+        mdc_mock.capture = capture
+        # Frame with broken checksum fails before being validated
+        mdc_mock.reader.feed_data(noise[1:])
+        with pytest.raises(MDCResponseError):
+            await mdc_mock.volume(0)
+        # Searched for in stream after error, late bytes are discarded
+        mdc_mock.reader.feed_data(b'\x0f')
+        mdc_mock.writer.write.side_effect = lambda payload: (
+            mdc_mock.reader.feed_data(noise),
+            mdc_mock.feed_response(volume, 0, [15]))
+        assert await mdc_mock.volume(0) == (15,)
+    mdc_mock.capture = None
+    records = list(read_capture(tmp_path / 'capture.bin'))
+    assert [(r.direction, r.frame) for r in records] == [
+        (SENT, pack_payload(volume.CMD, 0)),
+        (RECEIVED, noise[1:]),
+        (RECEIVED, b'\x0f'),
+        (SENT, pack_payload(volume.CMD, 0)),
+        (RECEIVED, noise + pack_response(volume.CMD, 0, True, [15])),
+    ]
+
+
+@pytest.mark.parametrize('cmd,display_id,data,expected', [
+    (0x11, 0, b'', 'aa:11:00:00:11'),
+    (0x11, 1, [1], 'aa:11:01:01:01:14'),
+    ((0xc7, 0x88), 0xfe, b'\x01\x02', 'aa:c7:fe:03:88:01:02:53'),
+])
+def test_pack_payload(cmd, display_id, data, expected):
+    cached = _pack_cached.cache_info().currsize
+    assert repr_hex(pack_payload(cmd, display_id, data)) == expected
+    assert repr_hex(pack_payload(cmd, display_id, bytes(data))) == expected
+    # Only frames without data are cached
+    assert _pack_cached.cache_info().currsize <= cached + (not data)
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_reconnect():
+    connections = []
+
+    async def serve(reader, writer):
+        connections.append(writer)
+        while True:
+            request = await reader.read(5)
+            if not request:
+                return
+            if len(connections) != 2 and request[1] == HEARTBEAT_CMD:
+                # Display rebooted, so heartbeat is not answered
+                continue
+            writer.write(pack_response(request[1], request[2], True, [1]))
+
+    server = await asyncio.start_server(serve, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    async with MDC(f'127.0.0.1:{port}', timeout=0.1, heartbeat=0.05,
+                   keepalive=10) as mdc:
+        assert await mdc.volume(1) == (1,)
+        await asyncio.sleep(0.3)
+        assert len(connections) == 2
+        assert await mdc.volume(1) == (1,)
+
+    # Closing while heartbeat is in flight is not reconnecting
+    mdc = MDC(f'127.0.0.1:{port}', timeout=1, heartbeat=0.05)
+    await mdc.volume(1)
+    await asyncio.sleep(0.1)
+    await mdc.close()
+    await asyncio.sleep(0.1)
+    assert len(connections) == 3
+    assert not mdc.is_opened and mdc._heartbeat_task is None
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_probe():
+    identity = {
+        MDC.serial_number.CMD: b'SERIAL',
+        MDC.model_name.CMD: b'QM55R',
+        MDC.software_version.CMD: b'T-1',
+    }
+
+    async def serve_plain(reader, writer):
+        while True:
+            request = await reader.read(5)
+            if not request:
+                return
+            writer.write(pack_response(
+                request[1], request[2], True, identity[request[1]]))
+
+    async def serve_tls(reader, writer):
+        writer.write(b'MDCSTART<<TLS>>')
+
+    async def serve_reset(reader, writer):
+        # Closing with RST instead of FIN
+        writer.get_extra_info('socket').setsockopt(
+            socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        writer.transport.abort()
+
+    ports = {}
+    servers = []
+    for name, serve in [('plain', serve_plain), ('tls', serve_tls),
+                        ('reset', serve_reset)]:
+        servers.append(await asyncio.start_server(serve, '127.0.0.1', 0))
+        ports[name] = servers[-1].sockets[0].getsockname()[1]
+
+    assert await probe('127.0.0.1', ports['plain'], 0.2, identify=True) \
+        == Discovered('127.0.0.1', ports['plain'], False, {
+            'serial_number': 'SERIAL', 'model_name': 'QM55R',
+            'software_version': 'T-1'})
+    assert await probe('127.0.0.1', ports['tls'], 0.2, identify=True) \
+        == Discovered('127.0.0.1', ports['tls'], True, {})
+    assert await probe('127.0.0.1', ports['reset'], 0.2) is None
+
+    # Closed port
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    closed_port = sock.getsockname()[1]
+    sock.close()
+    assert await probe('127.0.0.1', closed_port, 0.2) is None
+
+    # Host resetting connection is not aborting scan of others
+    servers.append(await asyncio.start_server(
+        serve_reset, '127.0.0.2', ports['tls']))
+    found = []
+    await discover(['127.0.0.1', '127.0.0.2'], found.append,
+                   ports['tls'], 0.2)
+    assert found == [Discovered('127.0.0.1', ports['tls'], True, {})]
+
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+
+
+def test_connection_attributes(capsys):
+    cache = TLSTargetCache()
+    assert MDC.tls_target_cache is MDC.default_tls_target_cache
+    assert MDC('1.2.3.4').tls_target_cache is MDC.default_tls_target_cache
+    assert MDC('1.2.3.4', tls_cache=cache).tls_target_cache is cache
+
+    # Any true verbose value prints with target
+    MDC('1.2.3.4', verbose=1)._log('Connected')
+    assert capsys.readouterr().out == '1.2.3.4 Connected\n'
+    logged = []
+    MDC('1.2.3.4', verbose=logged.append)._log('Connected')
+    assert logged == ['Connected']
+
+
+@pytest.mark.asyncio
+async def test_tls_session_resumed(mdc_server, monkeypatch):
+    sessions = TLSSessionCache()
+    monkeypatch.setattr(MDC, 'tls_session_cache', sessions)
+    target = f'127.0.0.1:{await mdc_server(tls=True)}'
+    for _ in range(2):
+        mdc = MDC(target, pins={target: 1234})
+        assert await mdc.power(0) == (MDC.power.POWER_STATE.ON,)
+        assert mdc.is_tls_started
+        await mdc.close()
+    assert (sessions.handshakes, sessions.resumed) == (2, 1)
+    assert sessions.get(target) is not None
+    assert get_ssl_context() is get_ssl_context()
+
+
+@pytest.mark.asyncio
+async def test_tls_auto(mdc_server, tmp_path):
+    cache = TLSTargetCache(tmp_path / 'tls.json')
+    plain = f'127.0.0.1:{await mdc_server()}'
+    secured = f'127.0.0.1:{await mdc_server(tls=True)}'
+    loop = asyncio.get_event_loop()
+
+    mdc = MDC(secured, tls='auto', tls_cache=cache)
+    with pytest.raises(MDCTLSRequired):
+        await mdc.open()
+    assert not mdc.is_opened
+    for target in (plain, secured):
+        mdc = MDC(target, tls='auto', tls_cache=cache, tls_detect_timeout=0.2,
+                  pins={secured: 1234})
+        await mdc.power(0)
+        assert bool(mdc.is_tls_started) == (target == secured)
+        await mdc.close()
+    cache.save()
+
+    # Plain target is remembered, so it's not waited for TLS header
+    cache = TLSTargetCache(tmp_path / 'tls.json')
+    assert (cache.get(plain), cache.get(secured)) == (False, True)
+    mdc = MDC(plain, tls='auto', tls_cache=cache, tls_detect_timeout=1)
+    start = loop.time()
+    await mdc.open()
+    assert loop.time() - start < 0.5
+    await mdc.close()
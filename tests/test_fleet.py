@@ -0,0 +1,17 @@
+import asyncio
+
+from samsung_mdc.fleet import run_sharded
+
+
+async def echo(i, delay):
+    # Later items are finishing first
+    await asyncio.sleep(delay)
+    print('item', i)
+    return i * 2
+
+
+def test_run_sharded():
+    items = [(i, (10 - i) / 1000) for i in range(10)]
+    assert list(run_sharded(echo, items, processes=2, shard_size=3)) == [
+        (i * 2, f'item {i}\n') for i in range(10)
+    ]